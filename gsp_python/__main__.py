@@ -2,15 +2,25 @@ import argparse
 import math
 import sys
 import os.path
+from . import benchmark
 from . import gsp
-from .gsp import GSP
-from .dataset_gen import DatasetGenerator
+from . import metrics
+from . import partition
+from . import query
+from .gsp import GSP, format_sequence
+from .checkpoint import CHECKPOINT_SUFFIX
+from .dataset import is_binary_ds, read_binary_ds, write_binary_ds
+from .dataset_gen import CHUNK_SIZE, DatasetGenerator
 import logging
 
 logging.basicConfig(level=logging.NOTSET, stream=sys.stdout,
                     format="%(levelname)s:%(module)s:%(message)s", force=True)
 
 
+"""Size of the buffer used when writing results to the output file"""
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+
 def setup_subparsers(parser):
     """Add subparsers for each algorithm"""
     subparsers = parser.add_subparsers()
@@ -27,10 +37,140 @@ def setup_subparsers(parser):
                             help='maximum size of frequent sequences found')
     parser_gsp.add_argument('-t', type=int, nargs=3, default=[math.inf, 0, math.inf],
                             metavar=('maxgap', 'mingap', 'maxspan'), help='specify time constraints')
+    parser_gsp.add_argument('--engine', choices=gsp.ENGINES, default='horizontal',
+                            help='support counting engine (default: horizontal)')
+    parser_gsp.add_argument('--compact', action='store_true', default=False,
+                            help='store the dataset in a compact array-based layout')
+    parser_gsp.add_argument('--cache', action='store_true', default=False,
+                            help='reuse (or create) a binary copy of the input file (infile'
+                                 + gsp.CACHE_SUFFIX + ') to skip parsing it')
+    parser_gsp.add_argument('-j', '--jobs', type=int, default=1,
+                            help='number of worker processes used for support counting (default: 1)')
+    parser_gsp.add_argument('--reduce', action='store_true', default=False,
+                            help='remove events and data-sequences that cannot contain further candidates '
+                                 'from the dataset at the end of each level')
+    parser_gsp.add_argument('--load-jobs', type=int, default=1,
+                            help='number of worker processes used for parsing the input file (default: 1)')
+    parser_gsp.add_argument('--metrics', metavar='METRICSFILE',
+                            help='write per-level metrics (timings, candidate counts, ...) to METRICSFILE')
+    parser_gsp.add_argument('--metrics-format', choices=metrics.METRICS_FORMATS, default='json',
+                            help='format of the metrics file (default: json)')
+    parser_gsp.add_argument('--output-mode', choices=gsp.OUTPUT_MODES, default='all',
+                            help='print all frequent sequences, only closed ones (no frequent supersequence with '
+                                 'the same support) or only maximal ones (no frequent supersequence) (default: all)')
+    parser_gsp.add_argument('--topk', type=int, metavar='K',
+                            help='only mine the K most frequent sequences (plus ties), raising the threshold during '
+                                 'the run; minsup acts as a lower bound')
+    parser_gsp.add_argument('--sample', type=int, metavar='SIZE',
+                            help='mine a random sample of SIZE data-sequences with a lowered threshold, then verify '
+                                 'the sequences found and their negative border on the whole dataset')
+    parser_gsp.add_argument('--sample-minsup', type=float,
+                            help='minimum support used on the sample (default: lowered according to SIZE)')
+    parser_gsp.add_argument('-s', '--seed', help='seed for sample selection')
+    parser_gsp.add_argument('--memory-limit', type=int, metavar='MIB',
+                            help='generate and count candidates in partitions, spilling frequent sequences to disk, '
+                                 'so that each level takes about MIB mebibytes')
+    parser_gsp.add_argument('--checkpoint', metavar='CKPTFILE',
+                            help='write the state of the run to CKPTFILE at the end of each level (default with '
+                                 '--resume: outfile + "' + CHECKPOINT_SUFFIX + '")')
+    parser_gsp.add_argument('--resume', action='store_true', default=False,
+                            help='restart from the last level recorded in the checkpoint file, if it exists')
 
     parser_gsp.add_argument('-v', '--verbose', action='store_true', default=False,
                             help='enable printing of debug messages')
 
+    """Subparser for dataset conversion to binary format"""
+    parser_convert = \
+        subparsers.add_parser('convert', help='convert a dataset to the binary (memory-mappable) format')
+    parser_convert.add_argument('infile', help='input file')
+    parser_convert.add_argument('outfile', help='output file')
+    parser_convert.add_argument('-j', '--jobs', type=int, default=1,
+                                help='number of worker processes used for parsing the input file (default: 1)')
+
+    """Subparser for partitioned (two-phase) mining"""
+    parser_partition = \
+        subparsers.add_parser('partition', help='partitioned (two-phase) mining, each phase runnable separately')
+    partition_subparsers = parser_partition.add_subparsers()
+    partition_subparsers.required = True
+    partition_subparsers.dest = 'action'
+
+    parser_split = \
+        partition_subparsers.add_parser('split', help='split a dataset in chunks of whole data-sequences')
+    parser_split.add_argument('infile', help='input file')
+    parser_split.add_argument('nchunks', type=int, help='# of chunks')
+    parser_split.add_argument('outprefix', help='prefix of the chunk files (outprefix.0, outprefix.1, ...)')
+
+    parser_count = \
+        partition_subparsers.add_parser('count', help='count the support of locally frequent sequences '
+                                                      'in a chunk')
+    parser_count.add_argument('chunkfile', help='chunk file')
+    parser_count.add_argument('outfile', help='output file (support counts)')
+    parser_count.add_argument('localfiles', nargs='+',
+                              help='GSP output files of all chunks (locally frequent sequences)')
+    parser_count.add_argument('-t', type=int, nargs=3, default=[math.inf, 0, math.inf],
+                              metavar=('maxgap', 'mingap', 'maxspan'), help='specify time constraints')
+    parser_count.add_argument('--engine', choices=gsp.ENGINES, default='horizontal',
+                              help='support counting engine (default: horizontal)')
+
+    parser_merge = \
+        partition_subparsers.add_parser('merge', help='sum the support counts of all chunks and keep the '
+                                                      'globally frequent sequences')
+    parser_merge.add_argument('outfile', help='output file')
+    parser_merge.add_argument('minsup', type=float, help='minimum support')
+    parser_merge.add_argument('countfiles', nargs='+', help='support count files of all chunks')
+
+    parser_run = \
+        partition_subparsers.add_parser('run', help='run all phases')
+    parser_run.add_argument('infile', help='input file')
+    parser_run.add_argument('outfile', help='output file')
+    parser_run.add_argument('minsup', type=float, help='minimum support')
+    parser_run.add_argument('-n', '--nchunks', type=int, default=4, help='# of chunks (default: 4)')
+    parser_run.add_argument('--maxk', type=int, default=math.inf,
+                            help='maximum size of frequent sequences found')
+    parser_run.add_argument('-t', type=int, nargs=3, default=[math.inf, 0, math.inf],
+                            metavar=('maxgap', 'mingap', 'maxspan'), help='specify time constraints')
+    parser_run.add_argument('--engine', choices=gsp.ENGINES, default='horizontal',
+                            help='support counting engine (default: horizontal)')
+    parser_run.add_argument('-j', '--jobs', type=int, default=1,
+                            help='number of worker processes, each processing one chunk at a time (default: 1)')
+    parser_run.add_argument('--work-dir', help='directory where intermediate files are kept '
+                                               '(default: a temporary directory, removed at the end)')
+    parser_run.add_argument('-v', '--verbose', action='store_true',
+                            help='enable printing of debug messages')
+
+    """Subparser for the query server"""
+    parser_query = \
+        subparsers.add_parser('query', help='serve support queries about single sequences over a dataset')
+    parser_query.add_argument('infile', help='input file (text or binary dataset)')
+    parser_query.add_argument('--host', default=query.HOST, help=f'address to listen on (default: {query.HOST})')
+    parser_query.add_argument('--port', type=int, default=query.PORT,
+                              help=f'port to listen on (default: {query.PORT})')
+    parser_query.add_argument('--cache-size', type=int, default=query.CACHE_SIZE,
+                              help=f'number of query results kept in the cache (default: {query.CACHE_SIZE})')
+    parser_query.add_argument('--compact', action='store_true', default=False,
+                              help='store the dataset in a compact array-based layout')
+    parser_query.add_argument('-v', '--verbose', action='store_true',
+                              help='enable printing of debug messages')
+
+    """Subparser for benchmark"""
+    parser_bench = \
+        subparsers.add_parser('benchmark', help='run GSP on a fixed set of generated datasets')
+    parser_bench.add_argument('outfile', help='output file (JSON)')
+    parser_bench.add_argument('--baseline', help='JSON file with previous results to compare with')
+    parser_bench.add_argument('--threshold', type=float, default=benchmark.THRESHOLD,
+                              help='relative increase of wall time or peak memory reported as regression '
+                                   f'(default: {benchmark.THRESHOLD})')
+    parser_bench.add_argument('--quick', action='store_true', default=False,
+                              help='only run the smaller workloads')
+    parser_bench.add_argument('--repeat', type=int, default=1,
+                              help='number of timed runs per workload (the best one is recorded)')
+    parser_bench.add_argument('--engine', choices=gsp.ENGINES, default='horizontal',
+                              help='support counting engine (default: horizontal)')
+    parser_bench.add_argument('-j', '--jobs', type=int, default=1,
+                              help='number of worker processes used for support counting (default: 1)')
+    parser_bench.add_argument('-v', '--verbose', action='store_true', default=False,
+                              help='print the results of each workload')
+
     """Subparser for sequence dataset generator"""
     parser_dsgen = \
         subparsers.add_parser('DatasetGen', help='sequence dataset generator')
@@ -41,6 +181,15 @@ def setup_subparsers(parser):
     parser_dsgen.add_argument('avgelems', type=int, help='average # of elements in a sequence')
     parser_dsgen.add_argument('--items', help='file specifying the items the dataset will contain (one per line)')
     parser_dsgen.add_argument('-s', '--seed', help='seed for random event generation')
+    parser_dsgen.add_argument('--streaming', action='store_true', default=False,
+                              help='generate the dataset in chunks, writing each one as soon as it is ready')
+    parser_dsgen.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                              help=f'# of sequences per chunk in streaming mode (default: {CHUNK_SIZE})')
+    parser_dsgen.add_argument('-j', '--jobs', type=int, default=1,
+                              help='number of worker processes generating chunks (implies --streaming)')
+    parser_dsgen.add_argument('--vectorized', action='store_true', default=False,
+                              help='draw the random values of each chunk with NumPy (requires NumPy, implies '
+                                   '--streaming)')
     parser_dsgen.add_argument('-v', '--verbose', action='store_true',
                               help='enable printing of debug messages')
 
@@ -53,13 +202,27 @@ def main(argv):
 
     if parsed_argv.subcommand == "GSP":
         """Loading dataset from input file"""
-        dataset, int_to_str_dict, str_to_int_dict = gsp.load_ds(parsed_argv.infile)
+        if os.path.exists(parsed_argv.infile) and is_binary_ds(parsed_argv.infile):
+            dataset, int_to_str_dict, str_to_int_dict = read_binary_ds(parsed_argv.infile)
+        elif parsed_argv.cache:
+            dataset, int_to_str_dict, str_to_int_dict = gsp.load_cached_ds(parsed_argv.infile,
+                                                                           workers=parsed_argv.load_jobs)
+        else:
+            dataset, int_to_str_dict, str_to_int_dict = gsp.load_ds(parsed_argv.infile, parsed_argv.compact,
+                                                                    parsed_argv.load_jobs)
         if not dataset:
             print("Could not load dataset from input file")
             sys.exit(1)
 
-        """Checking output file"""
-        if os.path.exists(parsed_argv.outfile):
+        checkpoint_filename = parsed_argv.checkpoint
+        if checkpoint_filename is None and parsed_argv.resume:
+            checkpoint_filename = parsed_argv.outfile + CHECKPOINT_SUFFIX
+        resuming = parsed_argv.resume and os.path.exists(checkpoint_filename)
+
+        """Checking output file (when resuming, it's rewritten from the
+        checkpoint without asking)
+        """
+        if os.path.exists(parsed_argv.outfile) and not resuming:
             print("File", parsed_argv.outfile, "already exists, want to proceed? [Y/N]")
             answer = ""
             while answer not in ["Y", "y", "N", "n"]:
@@ -68,31 +231,179 @@ def main(argv):
                 if answer in ["N", "n"]:
                     print("Quitting")
                     sys.exit()
-        output = open(parsed_argv.outfile, 'w')
 
         """Checking min support"""
         if (parsed_argv.minsup < 0) | (parsed_argv.minsup > 1):
             print("minsup must be a decimal between 0 and 1")
             sys.exit(1)
 
+        """Checking sample size and options not available when sampling"""
+        if parsed_argv.sample is not None:
+            if parsed_argv.sample < 1:
+                print("sample size must be a positive integer")
+                sys.exit(1)
+            if parsed_argv.topk is not None or parsed_argv.output_mode != "all":
+                print("--sample is only available with --output-mode all and without --topk")
+                sys.exit(1)
+            if parsed_argv.checkpoint is not None or parsed_argv.resume or parsed_argv.metrics is not None:
+                print("--sample can't be used with --checkpoint, --resume or --metrics")
+                sys.exit(1)
+            if parsed_argv.memory_limit is not None or parsed_argv.reduce:
+                print("--sample can't be used with --memory-limit or --reduce")
+                sys.exit(1)
+        elif parsed_argv.sample_minsup is not None or parsed_argv.seed is not None:
+            print("--sample-minsup and --seed require --sample")
+            sys.exit(1)
+
+        memory_limit = None
+        if parsed_argv.memory_limit is not None:
+            memory_limit = parsed_argv.memory_limit * 2 ** 20
+
         """Running GSP algorithm"""
-        algo_obj = GSP(dataset, parsed_argv.minsup, parsed_argv.maxk, parsed_argv.t[0],
-                       parsed_argv.t[1], parsed_argv.t[2], parsed_argv.verbose)
-        result = algo_obj.run_gsp()
+        try:
+            algo_obj = GSP(dataset, parsed_argv.minsup, parsed_argv.maxk, parsed_argv.t[0],
+                           parsed_argv.t[1], parsed_argv.t[2], parsed_argv.verbose, parsed_argv.engine,
+                           parsed_argv.jobs, checkpoint_filename=checkpoint_filename, resume=parsed_argv.resume,
+                           memory_limit=memory_limit, topk=parsed_argv.topk,
+                           output_mode=parsed_argv.output_mode, reduce=parsed_argv.reduce)
+        except ValueError as error:
+            print(error)
+            sys.exit(1)
 
-        """Printing to output file"""
-        for sequence_info in result:
-            for element in sequence_info[0]:
-                sorted_element = []
-                for event in element:
-                    sorted_element.append(int_to_str_dict[event])
-                sorted_element.sort()
+        if parsed_argv.sample is not None:
+            """Mining a sample and verifying results on the whole dataset"""
+            try:
+                results = algo_obj.run_sampling(parsed_argv.sample, parsed_argv.sample_minsup, parsed_argv.seed)
+            except ValueError as error:
+                print(error)
+                sys.exit(1)
+            if algo_obj.possible_misses:
+                print(len(algo_obj.possible_misses), "sequences of the negative border are frequent, some frequent "
+                      "sequences may be missing from the output (try a larger sample or a lower --sample-minsup)")
+        else:
+            results = algo_obj.iter_gsp()
 
-                for event in sorted_element:
-                    output.write(f"{event} ")
+        """Printing to output file as soon as each level is completed"""
+        with open(parsed_argv.outfile, 'w', buffering=OUTPUT_BUFFER_SIZE) as output:
+            for elements, support_count in results:
+                output.write(format_sequence(elements, support_count, int_to_str_dict))
 
-                output.write("-1 ")
-            output.write(f"#SUP: {sequence_info[1]}\n")
+        """Printing metrics"""
+        if parsed_argv.metrics is not None:
+            metrics.write_metrics(algo_obj.metrics, parsed_argv.metrics, parsed_argv.metrics_format)
+
+    elif parsed_argv.subcommand == "convert":
+        """Loading dataset from input file"""
+        dataset, int_to_str_dict, str_to_int_dict = gsp.load_ds(parsed_argv.infile, compact=True,
+                                                                workers=parsed_argv.jobs)
+        if not dataset:
+            print("Could not load dataset from input file")
+            sys.exit(1)
+
+        """Checking output file"""
+        if os.path.exists(parsed_argv.outfile):
+            print("File", parsed_argv.outfile, "already exists, want to proceed? [Y/N]")
+            answer = ""
+            while answer not in ["Y", "y", "N", "n"]:
+                answer = input()
+
+                if answer in ["N", "n"]:
+                    print("Quitting")
+                    sys.exit()
+
+        write_binary_ds(parsed_argv.outfile, dataset, int_to_str_dict, parsed_argv.infile)
+
+    elif parsed_argv.subcommand == "partition":
+        """Checking input files"""
+        if parsed_argv.action == "count":
+            input_filenames = [parsed_argv.chunkfile] + parsed_argv.localfiles
+        elif parsed_argv.action == "merge":
+            input_filenames = parsed_argv.countfiles
+        else:
+            input_filenames = [parsed_argv.infile]
+        for input_filename in input_filenames:
+            if not os.path.exists(input_filename):
+                print("File", input_filename, "not found.")
+                sys.exit(1)
+
+        if parsed_argv.action == "split":
+            if parsed_argv.nchunks < 1:
+                print("nchunks must be a positive integer")
+                sys.exit(1)
+            for chunk_filename in partition.split_dataset(parsed_argv.infile, parsed_argv.nchunks,
+                                                          parsed_argv.outprefix):
+                print(chunk_filename)
+            return
+
+        """Checking min support"""
+        if parsed_argv.action in ["merge", "run"] and ((parsed_argv.minsup < 0) | (parsed_argv.minsup > 1)):
+            print("minsup must be a decimal between 0 and 1")
+            sys.exit(1)
+
+        """Checking output file"""
+        if os.path.exists(parsed_argv.outfile):
+            print("File", parsed_argv.outfile, "already exists, want to proceed? [Y/N]")
+            answer = ""
+            while answer not in ["Y", "y", "N", "n"]:
+                answer = input()
+
+                if answer in ["N", "n"]:
+                    print("Quitting")
+                    sys.exit()
+
+        if parsed_argv.action == "count":
+            partition.count_chunk(parsed_argv.chunkfile, parsed_argv.outfile, parsed_argv.localfiles,
+                                  parsed_argv.t[0], parsed_argv.t[1], parsed_argv.t[2], parsed_argv.engine)
+        elif parsed_argv.action == "merge":
+            partition.merge_counts(parsed_argv.countfiles, parsed_argv.outfile, parsed_argv.minsup)
+        else:
+            if parsed_argv.nchunks < 1 or parsed_argv.jobs < 1:
+                print("nchunks and jobs must be positive integers")
+                sys.exit(1)
+            partition.mine_partitioned(parsed_argv.infile, parsed_argv.outfile, parsed_argv.minsup,
+                                       parsed_argv.nchunks, parsed_argv.maxk, parsed_argv.t[0], parsed_argv.t[1],
+                                       parsed_argv.t[2], parsed_argv.engine, parsed_argv.jobs,
+                                       parsed_argv.work_dir, parsed_argv.verbose)
+
+    elif parsed_argv.subcommand == "query":
+        """Loading dataset from input file"""
+        if os.path.exists(parsed_argv.infile) and is_binary_ds(parsed_argv.infile):
+            dataset, int_to_str_dict, str_to_int_dict = read_binary_ds(parsed_argv.infile)
+        else:
+            dataset, int_to_str_dict, str_to_int_dict = gsp.load_ds(parsed_argv.infile, parsed_argv.compact)
+        if not dataset:
+            print("Could not load dataset from input file")
+            sys.exit(1)
+
+        """Checking cache size"""
+        if parsed_argv.cache_size < 0:
+            print("cache size must be a non-negative integer")
+            sys.exit(1)
+
+        engine = query.QueryEngine(dataset, str_to_int_dict, parsed_argv.cache_size, parsed_argv.verbose)
+        query.run_server(engine, parsed_argv.host, parsed_argv.port)
+
+    elif parsed_argv.subcommand == "benchmark":
+        baseline = None
+        if parsed_argv.baseline is not None:
+            if not os.path.exists(parsed_argv.baseline):
+                print("File", parsed_argv.baseline, "not found.")
+                sys.exit(1)
+            baseline = benchmark.load_results(parsed_argv.baseline)
+
+        """Running benchmark"""
+        results = benchmark.run_benchmark(benchmark.default_workloads(parsed_argv.quick), parsed_argv.engine,
+                                          parsed_argv.jobs, parsed_argv.repeat, parsed_argv.verbose)
+        benchmark.save_results(results, parsed_argv.outfile)
+
+        """Comparing with baseline"""
+        if baseline is not None:
+            regressions = benchmark.compare_results(results, baseline, parsed_argv.threshold)
+            for regression in regressions:
+                print(regression)
+            if regressions:
+                sys.exit(1)
+            print("No regressions found")
 
     elif parsed_argv.subcommand == "DatasetGen":
 
@@ -120,6 +431,19 @@ def main(argv):
                     dictionary[key] = item
                     key += 1
 
+        """Checking chunk size and number of jobs"""
+        if parsed_argv.chunk_size < 1 or parsed_argv.jobs < 1:
+            print("chunk size and number of jobs must be positive integers")
+            sys.exit(1)
+
+        try:
+            algo_obj = DatasetGenerator(parsed_argv.size, parsed_argv.nevents,
+                                        parsed_argv.maxevents, parsed_argv.avgelems,
+                                        parsed_argv.seed, parsed_argv.verbose, parsed_argv.vectorized)
+        except ValueError as error:
+            print(error)
+            sys.exit(1)
+
         """Checking output file"""
         if os.path.exists(parsed_argv.outfile):
             print("File", parsed_argv.outfile, "already exists, want to proceed? [Y/N]")
@@ -130,12 +454,15 @@ def main(argv):
                 if answer in ["N", "n"]:
                     print("Quitting")
                     sys.exit()
-        output = open(parsed_argv.outfile, 'w')
+        output = open(parsed_argv.outfile, 'w', buffering=OUTPUT_BUFFER_SIZE)
 
         """Generating dataset"""
-        algo_obj = DatasetGenerator(parsed_argv.size, parsed_argv.nevents,
-                                    parsed_argv.maxevents, parsed_argv.avgelems,
-                                    parsed_argv.seed, parsed_argv.verbose)
+        if parsed_argv.streaming or parsed_argv.jobs > 1 or parsed_argv.vectorized:
+            """Each chunk is printed to output file as soon as it's generated"""
+            algo_obj.write_sequence_dataset(output, dictionary, parsed_argv.chunk_size, parsed_argv.jobs)
+            output.close()
+            return
+
         result = algo_obj.generate_sequence_dataset()
 
         """Printing to output file"""
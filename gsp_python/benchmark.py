@@ -0,0 +1,139 @@
+import itertools
+import json
+import logging
+import math
+import platform
+import time
+import tracemalloc
+from .dataset_gen import DatasetGenerator
+from .gsp import GSP
+
+"""Logger for tracking execution on stdout"""
+logger = logging.getLogger(__name__)
+
+"""Parameters of the default benchmark workloads; every combination of the
+values below is a workload
+"""
+SIZES = (500, 1000)
+NEVENTS = (20, 50)
+MAXEVENTS = (4,)
+AVGELEMS = (5, 8)
+MINSUPS = (0.1, 0.2)
+TIME_CONSTRAINTS = ((math.inf, 0, math.inf), (2, 0, 4))
+SEED = 42
+
+"""Parameters of the quick benchmark workloads"""
+QUICK_SIZES = (500,)
+QUICK_AVGELEMS = (5,)
+
+"""Default relative increase of wall time/peak memory reported as regression"""
+THRESHOLD = 0.1
+
+
+def default_workloads(quick=False):
+    """Return the list of default workloads, each a dictionary with the
+    DatasetGenerator and GSP parameters to use
+    """
+    sizes = QUICK_SIZES if quick else SIZES
+    avgelems = QUICK_AVGELEMS if quick else AVGELEMS
+
+    workloads = []
+    for size, nevents, maxevents, avgelem, minsup, time_constraints in \
+            itertools.product(sizes, NEVENTS, MAXEVENTS, avgelems, MINSUPS, TIME_CONSTRAINTS):
+        maxgap, mingap, maxspan = time_constraints
+        name = f"size={size},nevents={nevents},maxevents={maxevents},avgelems={avgelem},minsup={minsup}"
+        if maxgap != math.inf or mingap != 0 or maxspan != math.inf:
+            name += f",t={maxgap}/{mingap}/{maxspan}"
+        workloads.append({"name": name, "size": size, "nevents": nevents, "maxevents": maxevents,
+                          "avgelems": avgelem, "minsup": minsup, "maxgap": maxgap, "mingap": mingap,
+                          "maxspan": maxspan, "seed": SEED})
+    return workloads
+
+
+def run_workload(workload, engine="horizontal", workers=1, repeat=1):
+    """Run GSP on the dataset generated for workload, returning the best wall
+    time over repeat runs, the peak memory allocated while mining and the
+    metrics of each level (as recorded by GSP)
+    """
+    ds = DatasetGenerator(workload["size"], workload["nevents"], workload["maxevents"],
+                          workload["avgelems"], workload["seed"]).generate_sequence_dataset()
+
+    def new_gsp():
+        return GSP(ds, workload["minsup"], maxgap=workload["maxgap"], mingap=workload["mingap"],
+                   maxspan=workload["maxspan"], engine=engine, workers=workers)
+
+    wall_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        algo_obj = new_gsp()
+        output = algo_obj.run_gsp()
+        wall_times.append(time.perf_counter() - start)
+
+    """Memory is measured on a separate run, as tracing slows execution down"""
+    tracemalloc.start()
+    try:
+        new_gsp().run_gsp()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"name": workload["name"], "wall_time": min(wall_times), "peak_memory": peak_memory,
+            "frequent": len(output), "levels": algo_obj.metrics}
+
+
+def run_benchmark(workloads=None, engine="horizontal", workers=1, repeat=1, verbose=False):
+    """Run all workloads (the default ones if none are given), returning a
+    dictionary with the results that can be dumped to JSON
+    """
+    if workloads is None:
+        workloads = default_workloads()
+
+    logger.disabled = not verbose
+
+    results = []
+    for workload in workloads:
+        result = run_workload(workload, engine, workers, repeat)
+        results.append(result)
+        if verbose:
+            logger.info(f"{result['name']}: {result['wall_time']:.3f} s, "
+                        f"{result['peak_memory'] / 2 ** 20:.1f} MiB, {result['frequent']} frequent sequences")
+
+    return {"python": platform.python_version(), "engine": engine, "workers": workers,
+            "workloads": workloads, "results": results}
+
+
+def compare_results(results, baseline, threshold=THRESHOLD):
+    """Compare benchmark results with baseline results, returning a list of
+    messages describing the regressions found: workloads whose wall time or
+    peak memory grew by more than threshold (relative), or whose number of
+    frequent sequences changed
+    """
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+
+    regressions = []
+    for result in results["results"]:
+        name = result["name"]
+        if name not in baseline_results:
+            continue
+        old = baseline_results[name]
+
+        if result["frequent"] != old["frequent"]:
+            regressions.append(f"{name}: {result['frequent']} frequent sequences found "
+                               f"instead of {old['frequent']}")
+        for metric in ("wall_time", "peak_memory"):
+            if old[metric] > 0 and (result[metric] - old[metric]) / old[metric] > threshold:
+                regressions.append(f"{name}: {metric} went from {old[metric]:.6g} to {result[metric]:.6g} "
+                                   f"(+{(result[metric] - old[metric]) / old[metric]:.1%})")
+    return regressions
+
+
+def save_results(results, output_filename):
+    """Write benchmark results to output_filename as JSON"""
+    with open(output_filename, 'w') as output:
+        json.dump(results, output, indent=2)
+
+
+def load_results(input_filename):
+    """Read benchmark results from JSON file input_filename"""
+    with open(input_filename) as input_file:
+        return json.load(input_file)
@@ -0,0 +1,78 @@
+"""Positions of the set bits for every possible byte value"""
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+class Bitmap:
+    """A class that models an immutable set of dataset indexes.
+
+    Indexes are stored as the bits of a Python int, so that intersections
+    are computed with a single AND and the size of the set with a popcount.
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits=0):
+        """Initialize an instance of the class with the int whose set bits
+        mark the indexes contained in the set
+        """
+        self.bits = bits
+
+    @classmethod
+    def from_indexes(cls, indexes):
+        """Return a bitmap containing all the given indexes"""
+        buffer = bytearray()
+        for index in indexes:
+            byte_index = index >> 3
+            if byte_index >= len(buffer):
+                buffer.extend(bytes(byte_index + 1 - len(buffer)))
+            buffer[byte_index] |= 1 << (index & 7)
+        return cls(int.from_bytes(buffer, "little"))
+
+    @classmethod
+    def from_range(cls, start, stop):
+        """Return a bitmap containing all indexes from start (included) to
+        stop (excluded)
+        """
+        if stop <= start:
+            return cls(0)
+        return cls(((1 << (stop - start)) - 1) << start)
+
+    def intersection(self, other):
+        """Return the indexes contained both in this bitmap and in other"""
+        return Bitmap(self.bits & other.bits)
+
+    def union(self, other):
+        """Return the indexes contained either in this bitmap or in other"""
+        return Bitmap(self.bits | other.bits)
+
+    __and__ = intersection
+    __or__ = union
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __contains__(self, index):
+        return index >= 0 and (self.bits >> index) & 1 == 1
+
+    def __iter__(self):
+        """Iterate over the indexes in ascending order"""
+        data = self.bits.to_bytes((self.bits.bit_length() + 7) >> 3, "little")
+        for byte_index, byte in enumerate(data):
+            if byte:
+                base = byte_index << 3
+                for bit in _BYTE_BITS[byte]:
+                    yield base + bit
+
+    def __eq__(self, other):
+        if isinstance(other, Bitmap):
+            return self.bits == other.bits
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __repr__(self):
+        return f"Bitmap({list(self)})"
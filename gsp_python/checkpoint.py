@@ -0,0 +1,47 @@
+import hashlib
+import os
+import pickle
+import zlib
+from .dataset import CompactDataset
+
+"""Checkpoint file format: the magic string followed by the zlib-compressed
+pickle of the state dictionary
+"""
+MAGIC = b"GSPCKPT\x01"
+
+"""Suffix of the checkpoint files written by default from the command line"""
+CHECKPOINT_SUFFIX = ".ckpt"
+
+
+def dataset_fingerprint(ds):
+    """Return a string identifying the contents of dataset ds, which is the
+    same whether ds is a list of lists of lists of events or a CompactDataset
+    """
+    if not isinstance(ds, CompactDataset):
+        ds = CompactDataset.from_sequences(ds)
+    digest = hashlib.sha256()
+    for data in (ds.events, ds.element_offsets, ds.sequence_offsets):
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def write_checkpoint(output_filename, state):
+    """Write state to output_filename; the file is replaced atomically, so a
+    run killed while writing leaves the previous checkpoint intact
+    """
+    data = zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+    temp_filename = output_filename + ".tmp"
+    with open(temp_filename, 'wb') as output:
+        output.write(MAGIC)
+        output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temp_filename, output_filename)
+
+
+def read_checkpoint(input_filename):
+    """Return the state stored in checkpoint file input_filename"""
+    with open(input_filename, 'rb') as input_file:
+        if input_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{input_filename} is not a checkpoint file")
+        return pickle.loads(zlib.decompress(input_file.read()))
@@ -0,0 +1,111 @@
+from array import array
+from bisect import bisect_left
+from itertools import combinations, compress
+import math
+
+"""Pairs of events are identified by the code a * size + b, where a and b are
+the ranks of the two events (from 0 to size - 1)
+"""
+
+
+def sequence_pairs(sequence, ranks, size, maxgap=math.inf, mingap=0, maxspan=math.inf):
+    """Return the codes of the pairs of events (a, b) such that <(a)(b)> is
+    contained in data-sequence sequence with the maxgap/mingap/maxspan time
+    constraints, and of the pairs (a, b), rank of a < rank of b, such that
+    <(a b)> is; only events in ranks (a dictionary mapping each of them to its
+    rank) are considered, and each pair is returned once
+    """
+    elements = [sorted({ranks[event] for event in element if event in ranks}) for element in sequence]
+
+    same = set()
+    for element in elements:
+        if len(element) > 1:
+            same.update(a * size + b for a, b in combinations(element, 2))
+
+    """Elements of a 2-sequence are at most min(maxgap, maxspan) positions
+    apart
+    """
+    window = min(maxgap, maxspan)
+    if window == math.inf:
+        """a occurs before b (more than mingap positions apart) if and only
+        if its first occurrence does with respect to the last occurrence of b
+        """
+        first = {}
+        last = {}
+        for position, element in enumerate(elements):
+            for event in element:
+                first.setdefault(event, position)
+                last[event] = position
+        order = list(first)
+        first_positions = list(first.values())
+        before = [a * size + b for b, last_position in last.items()
+                  for a in order[:bisect_left(first_positions, last_position - mingap)]]
+    else:
+        before = set()
+        for j, element in enumerate(elements):
+            if element:
+                for i in range(max(0, j - int(window)), j - int(mingap)):
+                    for a in elements[i]:
+                        for b in element:
+                            before.add(a * size + b)
+
+    return before, same
+
+
+def count_pairs(ds, start, stop, ranks, size, maxgap=math.inf, mingap=0, maxspan=math.inf):
+    """Return two arrays of size * size counts, holding for each pair of
+    events the number of data-sequences of ds, from start (included) to stop
+    (excluded), containing <(a)(b)> and <(a b)> respectively, as found by
+    sequence_pairs; each data-sequence is visited once
+    """
+    typecode = count_typecode(stop - start)
+    before_counts = array(typecode, [0]) * (size * size)
+    same_counts = array(typecode, [0]) * (size * size)
+    for index in range(start, stop):
+        before, same = sequence_pairs(ds[index], ranks, size, maxgap, mingap, maxspan)
+        for code in before:
+            before_counts[code] += 1
+        for code in same:
+            same_counts[code] += 1
+    return before_counts, same_counts
+
+
+def count_typecode(n):
+    """Return the typecode of the smallest unsigned array items holding
+    counts up to n
+    """
+    for typecode in ("B", "H", "I", "L", "Q"):
+        if n < 1 << (8 * array(typecode).itemsize):
+            return typecode
+    raise ValueError(f"counts up to {n} don't fit in an array")
+
+
+def add_counts(counts, other):
+    """Add the counts of array other to array counts, in place"""
+    for code in compress(range(len(other)), other):
+        counts[code] += other[code]
+
+
+def frequent_codes(counts, threshold):
+    """Return the codes of the pairs whose count is at least threshold"""
+    return list(compress(range(len(counts)), map(threshold.__le__, counts)))
+
+
+def collect_pairs(ds, start, stop, ranks, size, before_codes, same_codes, maxgap=math.inf, mingap=0,
+                  maxspan=math.inf):
+    """Return two dictionaries mapping the codes in before_codes and
+    same_codes to the indexes of the data-sequences of ds, from start
+    (included) to stop (excluded), containing <(a)(b)> and <(a b)>
+    respectively
+    """
+    before_indexes = {}
+    same_indexes = {}
+    for index in range(start, stop):
+        before, same = sequence_pairs(ds[index], ranks, size, maxgap, mingap, maxspan)
+        for code in before:
+            if code in before_codes:
+                before_indexes.setdefault(code, []).append(index)
+        for code in same:
+            if code in same_codes:
+                same_indexes.setdefault(code, []).append(index)
+    return before_indexes, same_indexes
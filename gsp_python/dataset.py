@@ -0,0 +1,328 @@
+from array import array
+import io
+import mmap
+import os
+import re
+import struct
+import sys
+
+"""Binary dataset file format: a header, followed by the events, element
+offsets and sequence offsets arrays (each starting at a multiple of 8 bytes)
+and by the vocabulary, i.e. the string of each event id (from 1 onwards),
+one per line. The header stores the size and modification time of the text
+file the dataset was converted from, so that stale files can be detected.
+"""
+MAGIC = b"GSPDS\x00\x00\x01"
+HEADER = struct.Struct("<8s7q")
+
+"""Size of the blocks read while looking for chunk boundaries and copying
+chunks
+"""
+BLOCK_SIZE = 1 << 20
+
+"""Pattern matching the -2 token that terminates a data-sequence"""
+SEQUENCE_END = re.compile(rb"\s-2\s")
+
+
+class CompactDataset:
+    """A class that models a sequence dataset stored in a compact array-based
+    (CSR) layout.
+
+    All events are stored in a single flat array; element_offsets holds the
+    position in events where each element starts, and sequence_offsets holds
+    the position in element_offsets where each data-sequence starts (both
+    have one trailing entry marking the end of the last element/sequence).
+    Indexing the dataset returns a SequenceView, which can be used wherever a
+    data-sequence stored as a list of lists is expected.
+    """
+
+    def __init__(self, events=None, element_offsets=None, sequence_offsets=None, filename=None):
+        """Initialize an instance of the class with the given arrays, or an
+        empty dataset if none are given. If the arrays are mapped from a
+        binary dataset file, filename is the path of that file.
+        """
+        self.events = events if events is not None else array('i')
+        self.element_offsets = element_offsets if element_offsets is not None else array('q', [0])
+        self.sequence_offsets = sequence_offsets if sequence_offsets is not None else array('q', [0])
+        self.filename = filename
+
+    def __reduce__(self):
+        """Datasets mapped from a file are pickled as the path of the file,
+        so that other processes can map it instead of receiving a copy
+        """
+        if self.filename is not None:
+            return map_binary_ds, (self.filename,)
+        return CompactDataset, (self.events, self.element_offsets, self.sequence_offsets)
+
+    @classmethod
+    def from_sequences(cls, ds):
+        """Return a compact copy of dataset ds (a list of lists of lists of
+        events)
+        """
+        dataset = cls()
+        for sequence in ds:
+            dataset.append(sequence)
+        return dataset
+
+    def append(self, sequence):
+        """Add a data-sequence (a list of lists of events) at the end of the
+        dataset
+        """
+        for element in sequence:
+            self.events.extend(element)
+            self.element_offsets.append(len(self.events))
+        self.sequence_offsets.append(len(self.element_offsets) - 1)
+
+    def extend(self, other, event_map=None):
+        """Add all data-sequences of CompactDataset other at the end of the
+        dataset, converting each event e to event_map[e] if event_map is given
+        """
+        events = other.events if event_map is None else map(event_map.__getitem__, other.events)
+        element_start = len(self.element_offsets) - 1
+        event_start = len(self.events)
+        self.events.extend(events)
+        self.element_offsets.extend(event_start + offset for offset in other.element_offsets[1:])
+        self.sequence_offsets.extend(element_start + offset for offset in other.sequence_offsets[1:])
+
+    def to_sequences(self):
+        """Return the dataset as a list of lists of lists of events"""
+        events = self.events.tolist()
+        element_offsets = self.element_offsets.tolist()
+        sequence_offsets = self.sequence_offsets.tolist()
+        elements = [events[start:end] for start, end in zip(element_offsets, element_offsets[1:])]
+        return [elements[start:end] for start, end in zip(sequence_offsets, sequence_offsets[1:])]
+
+    def __len__(self):
+        return len(self.sequence_offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("dataset index out of range")
+        return SequenceView(self, self.sequence_offsets[index], self.sequence_offsets[index + 1])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield SequenceView(self, self.sequence_offsets[index], self.sequence_offsets[index + 1])
+
+
+class SequenceView:
+    """A class that models a read-only view of a data-sequence stored in a
+    CompactDataset. Each element is returned as an array of events.
+    """
+
+    __slots__ = ("dataset", "start", "end")
+
+    def __init__(self, dataset, start, end):
+        """Initialize a view of the elements of dataset from start (included)
+        to end (excluded)
+        """
+        self.dataset = dataset
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("sequence index out of range")
+        offsets = self.dataset.element_offsets
+        position = self.start + index
+        return self.dataset.events[offsets[position]:offsets[position + 1]]
+
+    def __iter__(self):
+        events = self.dataset.events
+        offsets = self.dataset.element_offsets
+        for position in range(self.start, self.end):
+            yield events[offsets[position]:offsets[position + 1]]
+
+    def __repr__(self):
+        return str([list(element) for element in self])
+
+
+def write_binary_ds(output_filename, dataset, int_to_str_dict, source_filename=None):
+    """Write dataset and the vocabulary of its events to output_filename in
+    the binary dataset format, recording the size and modification time of
+    source_filename (if given)
+    """
+    if not isinstance(dataset, CompactDataset):
+        dataset = CompactDataset.from_sequences(dataset)
+
+    if sorted(int_to_str_dict) != list(range(1, len(int_to_str_dict) + 1)):
+        raise ValueError("event ids must be consecutive integers starting from 1")
+    vocabulary = "\n".join(int_to_str_dict[event] for event in range(1, len(int_to_str_dict) + 1))
+    vocabulary = vocabulary.encode("utf-8")
+
+    if source_filename is not None:
+        source_stat = os.stat(source_filename)
+        source_size, source_mtime = source_stat.st_size, source_stat.st_mtime_ns
+    else:
+        source_size, source_mtime = -1, -1
+
+    with open(output_filename, 'wb') as output:
+        output.write(HEADER.pack(MAGIC, sys.byteorder == "little", len(dataset.events),
+                                 len(dataset.element_offsets), len(dataset.sequence_offsets),
+                                 len(vocabulary), source_size, source_mtime))
+        for data in (dataset.events, dataset.element_offsets, dataset.sequence_offsets):
+            size = output.write(data)
+            output.write(bytes(-size % 8))
+        output.write(vocabulary)
+
+
+def _read_header(input_file):
+    """Return the header fields of an open binary dataset file"""
+    fields = HEADER.unpack(input_file.read(HEADER.size))
+    if fields[0] != MAGIC:
+        raise ValueError(f"{input_file.name} is not a binary dataset file")
+    if fields[1] != (sys.byteorder == "little"):
+        raise ValueError(f"{input_file.name} was written on a machine with a different byte order")
+    return fields[2:]
+
+
+def _sections(n_events, n_element_offsets, n_sequence_offsets):
+    """Return the (start, end) byte positions of the arrays and of the
+    vocabulary in a binary dataset file
+    """
+    sections = []
+    start = HEADER.size
+    for size in (n_events * 4, n_element_offsets * 8, n_sequence_offsets * 8):
+        sections.append((start, start + size))
+        start += size + (-size % 8)
+    return sections, start
+
+
+def map_binary_ds(input_filename):
+    """Return the dataset contained in binary dataset file input_filename as
+    a CompactDataset whose arrays are memory-mapped from the file
+    """
+    with open(input_filename, 'rb') as input_file:
+        n_events, n_element_offsets, n_sequence_offsets = _read_header(input_file)[:3]
+        mapped = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    buffer = memoryview(mapped)
+    sections, _ = _sections(n_events, n_element_offsets, n_sequence_offsets)
+    arrays = [buffer[start:end].cast(typecode)
+              for (start, end), typecode in zip(sections, ('i', 'q', 'q'))]
+    return CompactDataset(*arrays, filename=input_filename)
+
+
+def read_binary_ds(input_filename):
+    """Return the dataset contained in binary dataset file input_filename
+    (memory-mapped) and the dictionaries converting event ids to strings and
+    vice versa
+    """
+    with open(input_filename, 'rb') as input_file:
+        n_events, n_element_offsets, n_sequence_offsets, vocabulary_size = _read_header(input_file)[:4]
+        _, start = _sections(n_events, n_element_offsets, n_sequence_offsets)
+        input_file.seek(start)
+        vocabulary = input_file.read(vocabulary_size).decode("utf-8")
+
+    int_to_str_dict = {}
+    str_to_int_dict = {}
+    if vocabulary:
+        for event, string in enumerate(vocabulary.split("\n"), 1):
+            int_to_str_dict[event] = string
+            str_to_int_dict[string] = event
+
+    return map_binary_ds(input_filename), int_to_str_dict, str_to_int_dict
+
+
+def is_binary_ds(input_filename):
+    """Check if input_filename is a binary dataset file"""
+    with open(input_filename, 'rb') as input_file:
+        return input_file.read(len(MAGIC)) == MAGIC
+
+
+def is_binary_ds_fresh(input_filename, source_filename):
+    """Check if binary dataset file input_filename was converted from the
+    current version of source_filename
+    """
+    try:
+        with open(input_filename, 'rb') as input_file:
+            source_size, source_mtime = _read_header(input_file)[4:]
+        source_stat = os.stat(source_filename)
+    except (OSError, ValueError, struct.error):
+        return False
+    return (source_size, source_mtime) == (source_stat.st_size, source_stat.st_mtime_ns)
+
+
+def find_boundary(input_file, position):
+    """Return the offset right after the first -2 token of binary file
+    input_file ending after offset position (so that a chunk can start
+    there), or the size of the file if there's none
+    """
+    if position == 0:
+        return 0
+
+    """The token must be preceded by whitespace, which may be the byte
+    right before position
+    """
+    offset = position - 1
+    input_file.seek(offset)
+    buffer = b""
+    while True:
+        block = input_file.read(BLOCK_SIZE)
+        if not block:
+            return offset + len(buffer)
+        buffer += block
+        match = SEQUENCE_END.search(buffer)
+        if match is not None:
+            return offset + match.end() - 1
+
+        """A token may be split between two blocks"""
+        tail = min(len(buffer), 3)
+        offset += len(buffer) - tail
+        buffer = buffer[len(buffer) - tail:]
+
+
+def chunk_ranges(input_filename, nchunks):
+    """Return the (start, end) byte offsets of (at most) nchunks chunks of
+    roughly the same size of the dataset in input_filename, each made of whole
+    data-sequences
+    """
+    size = os.path.getsize(input_filename)
+    with open(input_filename, 'rb') as input_file:
+        boundaries = [find_boundary(input_file, size * i // nchunks) for i in range(nchunks)] + [size]
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def parse_chunk(input_filename, start, end):
+    """Parse the text dataset between byte offsets start and end of
+    input_filename like load_ds; return it as a CompactDataset whose events
+    are numbered from 0 in order of first appearance, and the list of the
+    strings of those events
+    """
+    with open(input_filename, 'rb') as input_file:
+        input_file.seek(start)
+        data = input_file.read(end - start)
+
+    """Decoded as when the file is opened in text mode"""
+    strings = io.TextIOWrapper(io.BytesIO(data)).read().split()
+
+    str_to_id_dict = {}
+    vocabulary = []
+    events = array('i')
+    element_offsets = array('q', [0])
+    sequence_offsets = array('q', [0])
+    for string in strings:
+        if string == "-2":
+            """Events of an element not terminated by -1 are discarded"""
+            del events[element_offsets[-1]:]
+            sequence_offsets.append(len(element_offsets) - 1)
+        elif string == "-1":
+            element_offsets.append(len(events))
+        else:
+            event = str_to_id_dict.get(string)
+            if event is None:
+                event = str_to_id_dict[string] = len(vocabulary)
+                vocabulary.append(string)
+            events.append(event)
+
+    """A data-sequence not terminated by -2 is discarded"""
+    del element_offsets[sequence_offsets[-1] + 1:]
+    del events[element_offsets[-1]:]
+    return CompactDataset(events, element_offsets, sequence_offsets), vocabulary
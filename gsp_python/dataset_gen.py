@@ -1,8 +1,25 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import random
 import math
 import logging
 logger = logging.getLogger(__name__)
 
+try:
+    import numpy
+except ImportError:
+    """NumPy is only needed by the vectorized streaming mode"""
+    numpy = None
+
+"""Default number of data-sequences generated at once in streaming mode"""
+CHUNK_SIZE = 10000
+
+"""Number of events drawn ahead of use in streaming mode"""
+DRAW_AHEAD = 4096
+
+"""DatasetGenerator instance used by a worker process"""
+_worker_generator = None
+
 
 class DatasetGenerator:
     """A class that represents a sequence dataset generator.
@@ -11,7 +28,7 @@ class DatasetGenerator:
     with a specific set of parameters.
     """
 
-    def __init__(self, size, nevents, maxevents, avgelems, seed=None, verbose=False):
+    def __init__(self, size, nevents, maxevents, avgelems, seed=None, verbose=False, vectorized=False):
         """Initialize an instance with the given requirements:
             size: overall number of sequences in the dataset
             nevents:    number of unique events in the dataset
@@ -19,7 +36,12 @@ class DatasetGenerator:
             avgelems:   average number of elements contained in a single sequence
             seed:       the seed to be used for random number generation (if not
                         provided, random's default choice of seed is used)
+            vectorized: whether chunks are generated with NumPy in streaming
+                        mode (NumPy must be installed)
         """
+        if vectorized and numpy is None:
+            raise ValueError("the vectorized mode requires NumPy")
+        self.vectorized = vectorized
 
         self.size = size
         self.nevents = nevents
@@ -42,6 +64,9 @@ class DatasetGenerator:
         if seed is not None:
             random.seed(seed)
 
+        """Seed from which the seed of each chunk is derived in streaming mode"""
+        self.chunk_seed = seed if seed is not None else random.randrange(2 ** 64)
+
         if not verbose:
             logger.disabled = True
 
@@ -92,3 +117,162 @@ class DatasetGenerator:
             output.append(sequence)
 
         return output
+
+    def generate_chunk(self, chunk_index, chunk_size=CHUNK_SIZE):
+        """Generate the data-sequences of the given chunk of the dataset (the
+        one starting at sequence chunk_index * chunk_size), using a random
+        generator seeded for that chunk only, so that the same seed always
+        gives the same chunk regardless of the order chunks are generated in.
+        Random values are drawn one at a time with the random module, drawing
+        again the ones out of range; if the generator is vectorized, the chunk
+        is generated by generate_chunk_vectorized instead.
+        """
+        if self.vectorized:
+            return self.generate_chunk_vectorized(chunk_index, chunk_size)
+
+        rng = random.Random(f"{self.chunk_seed}:{chunk_index}")
+        count = max(0, min(chunk_size, self.size - chunk_index * chunk_size))
+
+        """Generate random lengths for all sequences, then for all elements"""
+        seq_lengths = _draw(rng, self.mu_length, self.s_length, 1, math.inf, count)
+        elem_lengths = _draw(rng, self.mu_elem, self.s_elem, 1, self.maxevents, sum(seq_lengths))
+
+        events = _stream(rng, self.mu_event, self.s_event, 1, self.nevents, DRAW_AHEAD)
+
+        output = []
+        elem_lengths = iter(elem_lengths)
+        for seq_length in seq_lengths:
+            sequence = []
+            for _ in range(seq_length):
+                """Element must not contain duplicate events, events are sorted
+                in ascending order
+                """
+                elem_length = next(elem_lengths)
+                element = set()
+                while len(element) < elem_length:
+                    element.add(next(events))
+                sequence.append(sorted(element))
+            output.append(sequence)
+
+        return output
+
+    def generate_chunk_vectorized(self, chunk_index, chunk_size=CHUNK_SIZE):
+        """Generate the data-sequences of the given chunk of the dataset like
+        generate_chunk, drawing all the lengths and events of the chunk at
+        once with a NumPy generator seeded for that chunk only; events
+        repeated in the same element are drawn again until there are none
+        """
+        seed = hashlib.sha256(f"{self.chunk_seed}:{chunk_index}".encode()).digest()
+        rng = numpy.random.default_rng(int.from_bytes(seed, "little"))
+        count = max(0, min(chunk_size, self.size - chunk_index * chunk_size))
+
+        seq_lengths = _draw_vectorized(rng, self.mu_length, self.s_length, 1, math.inf, count)
+        elem_lengths = _draw_vectorized(rng, self.mu_elem, self.s_elem, 1, self.maxevents, int(seq_lengths.sum()))
+
+        """Each event is paired with the element it belongs to; events are
+        sorted by element, then by value, so that repeated events are adjacent
+        """
+        element_ids = numpy.repeat(numpy.arange(len(elem_lengths)), elem_lengths)
+        events = _draw_vectorized(rng, self.mu_event, self.s_event, 1, self.nevents, len(element_ids))
+        while True:
+            order = numpy.lexsort((events, element_ids))
+            sorted_events = events[order]
+            repeated = (sorted_events[1:] == sorted_events[:-1]) & (element_ids[1:] == element_ids[:-1])
+            if not repeated.any():
+                break
+            slots = order[1:][repeated]
+            events[slots] = _draw_vectorized(rng, self.mu_event, self.s_event, 1, self.nevents, len(slots))
+
+        events = sorted_events.tolist()
+        element_offsets = [0] + numpy.cumsum(elem_lengths).tolist()
+        sequence_offsets = [0] + numpy.cumsum(seq_lengths).tolist()
+        elements = [events[start:end] for start, end in zip(element_offsets, element_offsets[1:])]
+        return [elements[start:end] for start, end in zip(sequence_offsets, sequence_offsets[1:])]
+
+    def write_sequence_dataset(self, output, dictionary=None, chunk_size=CHUNK_SIZE, workers=1):
+        """Generate a sequence dataset chunk by chunk, writing each chunk to
+        file object output as soon as it's ready (events are converted with
+        dictionary, if given). Chunks are generated by workers processes;
+        the result only depends on the seed and chunk_size.
+        """
+        if chunk_size < 1 or workers < 1:
+            raise ValueError("chunk_size and workers must be positive integers")
+
+        n_chunks = math.ceil(self.size / chunk_size)
+        if workers == 1:
+            for chunk_index in range(n_chunks):
+                output.write(format_chunk(self.generate_chunk(chunk_index, chunk_size), dictionary))
+                if self.verbose:
+                    logger.info(f"Chunk {chunk_index + 1}/{n_chunks} written")
+            return
+
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self, dictionary)) as executor:
+            chunks = executor.map(_generate_chunk_text, range(n_chunks), [chunk_size] * n_chunks)
+            for chunk_index, chunk in enumerate(chunks):
+                output.write(chunk)
+                if self.verbose:
+                    logger.info(f"Chunk {chunk_index + 1}/{n_chunks} written")
+
+
+def _draw(rng, mu, sigma, low, high, count):
+    """Return count integers drawn from a normal distribution with the given
+    mu and sigma (rounded to the nearest integer), all between low and high;
+    values out of range are replaced by new draws
+    """
+    gauss = rng.gauss
+    values = []
+    while len(values) < count:
+        drawn = [math.floor(gauss(mu, sigma) + 0.5) for _ in range(count - len(values))]
+        values.extend(value for value in drawn if low <= value <= high)
+    return values
+
+
+def _draw_vectorized(rng, mu, sigma, low, high, count):
+    """Return a NumPy array of count integers drawn like _draw, with the
+    NumPy generator rng
+    """
+    values = numpy.empty(0, dtype=numpy.int64)
+    while len(values) < count:
+        drawn = numpy.floor(rng.normal(mu, sigma, count - len(values)) + 0.5).astype(numpy.int64)
+        values = numpy.concatenate((values, drawn[(drawn >= low) & (drawn <= high)]))
+    return values
+
+
+def _stream(rng, mu, sigma, low, high, ahead):
+    """Yield integers drawn from a normal distribution with the given mu and
+    sigma (rounded to the nearest integer), all between low and high, drawing
+    ahead values at a time with _draw
+    """
+    while True:
+        yield from _draw(rng, mu, sigma, low, high, ahead)
+
+
+def format_chunk(chunk, dictionary=None):
+    """Return the given data-sequences in the dataset file format"""
+    lines = []
+    for sequence in chunk:
+        line = []
+        for element in sequence:
+            for event in element:
+                if dictionary:
+                    line.append(f"{dictionary[event]} ")
+                else:
+                    line.append(f"{event} ")
+            line.append("-1 ")
+        line.append("-2\n")
+        lines.append("".join(line))
+    return "".join(lines)
+
+
+def _init_worker(generator, dictionary):
+    """Store the generator and dictionary used by the current worker process"""
+    global _worker_generator
+    _worker_generator = (generator, dictionary)
+
+
+def _generate_chunk_text(chunk_index, chunk_size):
+    """Generate a chunk of the dataset in a worker process, returning it in
+    the dataset file format
+    """
+    generator, dictionary = _worker_generator
+    return format_chunk(generator.generate_chunk(chunk_index, chunk_size), dictionary)
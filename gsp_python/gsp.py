@@ -1,10 +1,48 @@
-from copy import deepcopy
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import heapq
 import math
 import logging
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+from . import checkpoint
+from . import cooccurrence
+from . import metrics
+from . import positions
+from . import vertical
+from .bitmap import Bitmap
+from .dataset import CompactDataset, chunk_ranges, is_binary_ds_fresh, parse_chunk, read_binary_ds, write_binary_ds
+from .hashtree import HashTree
 
 """Logger for tracking execution on stdout"""
 logger = logging.getLogger(__name__)
 
+"""Available support counting engines"""
+ENGINES = ("horizontal", "vertical", "hashtree")
+
+"""Available output modes"""
+OUTPUT_MODES = ("all", "closed", "maximal")
+
+"""Suffix of the binary dataset files written by load_cached_ds"""
+CACHE_SUFFIX = ".gspds"
+
+"""Number of candidate chunks assigned to each worker process per level"""
+CHUNKS_PER_WORKER = 4
+
+"""Probability that a frequent sequence isn't frequent in the sample with the
+default sample threshold of run_sampling
+"""
+SAMPLING_DELTA = 0.05
+
+"""GSP instance used by a worker process for support counting"""
+_worker_gsp = None
+
 
 class GSP:
     """A class that implements the Generalized Sequential Pattern algorithm.
@@ -14,13 +52,75 @@ class GSP:
     equal than a minimum threshold.
     """
 
-    def __init__(self, ds, minsup, max_k=math.inf, maxgap=math.inf, mingap=0, maxspan=math.inf, verbose=False):
+    """Whether frequent 2-sequences are found by run_level2 (except with a
+    memory limit)
+    """
+    cooccurrence_level2 = True
+
+    def __init__(self, ds, minsup, max_k=math.inf, maxgap=math.inf, mingap=0, maxspan=math.inf, verbose=False,
+                 engine="horizontal", workers=1, callback=None, checkpoint_filename=None, resume=False,
+                 memory_limit=None, topk=None, output_mode="all", reduce=False):
         """Initialize an instance of the class with a reference to the dataset
         from which frequent sequences must be mined and a minsupport threshold,
-        and maxgap/mingap/maxspan time constraints.
+        and maxgap/mingap/maxspan time constraints. The dataset can be either a
+        list of lists of lists of events or a CompactDataset.
+
+        engine selects how support is counted: "horizontal" scans the
+        data-sequences each candidate could appear in, "vertical" joins the
+        id-lists of the candidate's parents (SPADE-style), "hashtree" stores
+        candidates in a hash-tree and visits each data-sequence once.
+
+        workers is the number of processes support counting is split across
+        (not available for the vertical engine).
+
+        callback, if given, is called at the end of each level with a
+        dictionary of metrics about it (see the metrics module); the metrics
+        of all levels are also kept in the metrics attribute.
+
+        checkpoint_filename, if given, is the path of the file the state of
+        the run is written to at the end of each level; if resume is True and
+        the file exists, the run restarts from the last level recorded in it.
+
+        memory_limit, if given, is the number of bytes the candidates and
+        frequent sequences of each level should take: candidates are then
+        generated and counted in partitions, and frequent sequences are
+        spilled to disk when they exceed it (not available for the vertical
+        engine).
+
+        topk, if given, is the number of most frequent sequences to mine:
+        minsup is then raised during the run to the support of the topk-th
+        best sequence found so far, and only acts as a lower bound.
+
+        output_mode selects which frequent sequences are returned: "all" of
+        them, only "closed" ones (with no frequent supersequence with the same
+        support) or only "maximal" ones (with no frequent supersequence).
+
+        reduce, if True, rewrites the dataset used for containment checks at
+        the end of each level (see reduce_dataset; not available for the
+        vertical engine).
         """
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}")
+        if workers < 1:
+            raise ValueError("workers must be a positive integer")
+        if workers > 1 and engine == "vertical":
+            raise ValueError("the vertical engine does not support multiple workers")
+        if memory_limit is not None and memory_limit <= 0:
+            raise ValueError("memory_limit must be a positive integer")
+        if memory_limit is not None and engine == "vertical":
+            raise ValueError("the vertical engine does not support memory_limit")
+        if topk is not None and topk < 1:
+            raise ValueError("topk must be a positive integer")
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"output_mode must be one of {OUTPUT_MODES}")
+        if output_mode != "all" and topk is not None:
+            raise ValueError("topk is only available with output_mode 'all'")
+        if reduce and engine == "vertical":
+            raise ValueError("the vertical engine does not support reduce")
+
         self.ds = ds
         self.minsup = minsup
+        self.base_minsup = minsup
         self.maxgap = maxgap
         self.mingap = mingap
         self.maxspan = maxspan
@@ -30,71 +130,732 @@ class GSP:
 
         self.max_k = max_k
 
+        self.engine = engine
+        self.workers = workers
+        self.event_positions = {}
+        self.idlists = {}
+        self.position_indexes = []
+
+        self.callback = callback
+        self.metrics = []
+        self.containment_checks = 0
+        self.early_aborts = 0
+
+        self.memory_limit = memory_limit
+
+        self.topk = topk
+        self.best_supports = []
+
+        self.output_mode = output_mode
+        self.pending = []
+
+        self.possible_misses = []
+
+        """Dataset as rewritten by reduce_dataset, and the data-sequences that
+        can still contain candidates
+        """
+        self.reduce = reduce
+        self.reduced_ds = None
+        self.active_indexes = None
+
+        self.checkpoint_filename = checkpoint_filename
+        self.fingerprint = None
+        self.output = []
+        self.resume_state = None
+        if resume and checkpoint_filename is not None and os.path.exists(checkpoint_filename):
+            self.resume_state = self.read_checkpoint()
+
         self.verbose = verbose
         if not verbose:
             logger.disabled = True
 
+        start = time.perf_counter()
+
         """Find all unique events (1-sequences)"""
+        indexes = {}
         for index, sequence in enumerate(self.ds):
             for element in sequence:
                 for event in element:
-                    if event not in self.frequent_sequences:
-                        self.frequent_sequences[event] = [Sequence([[event]], set())]
-                    self.frequent_sequences[event][0].set_of_indexes.add(index)
+                    event_indexes = indexes.setdefault(event, [])
+                    if not event_indexes or event_indexes[-1] != index:
+                        event_indexes.append(index)
+        for event, event_indexes in indexes.items():
+            self.frequent_sequences[event] = [Sequence(((event,),), Bitmap.from_indexes(event_indexes))]
+
+        if self.engine == "vertical":
+            """Build vertical representation (event -> id-list) of the dataset"""
+            self.event_positions = vertical.build_event_positions(self.ds)
+        elif self.has_time_constraints():
+            """Build the position index of each data-sequence, used by
+            containment checks with time constraints
+            """
+            self.position_indexes = [positions.build_position_index(sequence) for sequence in self.ds]
+
+        self.init_time = time.perf_counter() - start
 
     def run_gsp(self):
+        """Run GSP algorithm, returning a list of (sequence, support count)
+        tuples
+        """
+        return list(self.iter_gsp())
+
+    def iter_gsp(self):
+        """Run GSP algorithm, yielding (sequence, support count) tuples level
+        by level, as soon as the support count of each level is completed
+        """
+        with self.open_executor() as executor:
+            if self.topk is None:
+                yield from self._iter_gsp(executor)
+                return
+
+            """The final threshold is only known at the end of the run, so
+            sequences found are kept until then
+            """
+            output = list(self._iter_gsp(executor))
+            n = len(self.ds)
+            for elements, support_count in output:
+                if support_count / n >= self.minsup:
+                    yield elements, support_count
+
+    def open_executor(self):
+        """Return a context manager giving the executor support counting is
+        split across, or None if there's a single worker
+        """
+        if self.workers == 1:
+            return contextlib.nullcontext()
+
+        """The dataset is shipped to each worker once, when it's started"""
+        if "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+        else:
+            mp_context = None
+        return ProcessPoolExecutor(self.workers, mp_context=mp_context,
+                                   initializer=_init_worker, initargs=(self,))
+
+    def run_sampling(self, sample_size, sample_minsup=None, seed=None):
+        """Run GSP algorithm on a random sample of sample_size data-sequences
+        with threshold sample_minsup (by default, minsup lowered according to
+        the sample size), then count on the whole dataset the support of the
+        sequences frequent in the sample and of their negative border, which
+        are the only candidates considered (the default threshold is at least
+        minsup / 2). Return a list of (sequence, support count) tuples like
+        run_gsp; border sequences found frequent on the whole dataset are
+        stored in the possible_misses attribute: if there are any, some
+        frequent sequences may be missing from the output
+        """
+        if sample_size < 1:
+            raise ValueError("sample_size must be a positive integer")
+        if self.topk is not None or self.output_mode != "all":
+            raise ValueError("run_sampling is only available with output_mode 'all' and without topk")
+        if self.memory_limit is not None or self.reduce:
+            raise ValueError("run_sampling is not available with memory_limit or reduce")
+
+        self.clear_reduction()
+        n = len(self.ds)
+        sample_size = min(sample_size, n)
+        if sample_minsup is None:
+            sample_minsup = self.minsup - math.sqrt(math.log(1 / SAMPLING_DELTA) / (2 * sample_size))
+            if sample_minsup < self.minsup / 2:
+                """With a small sample, the bound would make (almost) every
+                sequence frequent in the sample
+                """
+                logger.warning(f"Sample of {sample_size} data-sequences too small for minsup {self.minsup}, "
+                               f"using sample threshold {self.minsup / 2}")
+                sample_minsup = self.minsup / 2
+
+        """Mine the sample"""
+        indexes = sorted(random.Random(seed).sample(range(n), sample_size))
+        sample_gsp = GSP([self.ds[index] for index in indexes], sample_minsup, self.max_k, self.maxgap,
+                         self.mingap, self.maxspan, self.verbose, self.engine)
+        sample_frequent = {elements for elements, _ in sample_gsp.iter_gsp()}
+
+        """Support of 1-sequences is already known, the candidates of each
+        following level are generated (and pruned) from the candidates of
+        the previous level which are frequent in the sample: those which
+        aren't frequent in the sample form the negative border
+        """
         output = []
+        previous_sequences = {}
+        for event, sequence_list in self.frequent_sequences.items():
+            support_count = len(sequence_list[0].set_of_indexes)
+            if support_count / n >= self.minsup:
+                output.append((sequence_list[0].elements, support_count))
+                previous_sequences[event] = list(sequence_list)
+        keys = list(previous_sequences)
+
+        self.possible_misses = []
+        self.containment_checks = 0
+        frequent_sequences = self.frequent_sequences
+        k = 2
+        try:
+            with self.open_executor() as executor:
+                while previous_sequences and k <= self.max_k:
+                    self.frequent_sequences = previous_sequences
+                    self.generate_candidates(k)
+                    if k > 2:
+                        self.prune_candidates()
+                    candidates = self.candidate_sequences
+                    self.candidate_sequences = []
+
+                    """Candidates don't depend on the support counts of the
+                    previous level, which are only used to restrict the
+                    data-sequences each candidate is checked against
+                    """
+                    contained, checks = self.count_candidates(candidates, executor)
+                    self.containment_checks += checks
+
+                    level_sequences = {key: [] for key in keys}
+                    previous_sequences = {key: [] for key in keys}
+                    for candidate, indexes in zip(candidates, contained):
+                        if indexes is not None:
+                            candidate.set_of_indexes = Bitmap.from_indexes(indexes)
+                            if len(indexes) / n >= self.minsup:
+                                level_sequences[candidate.elements[0][0]].append(
+                                    (candidate.elements, len(indexes)))
+                                if candidate.elements not in sample_frequent:
+                                    self.possible_misses.append(candidate.elements)
+                        if candidate.elements in sample_frequent:
+                            previous_sequences[candidate.elements[0][0]].append(candidate)
+
+                    for sequence_list in level_sequences.values():
+                        output.extend(sequence_list)
+                    previous_sequences = {key: sequence_list for key, sequence_list in previous_sequences.items()
+                                          if sequence_list}
+                    k += 1
+        finally:
+            self.frequent_sequences = frequent_sequences
+
+        if self.verbose and self.possible_misses:
+            logger.info(f"*** {len(self.possible_misses)} sequences of the negative border are frequent, "
+                        f"some frequent sequences may be missing ***")
+        return output
 
+    def _iter_gsp(self, executor=None):
         """Run GSP algorithm"""
         if self.verbose:
             logger.info("STARTING GSP ALGORITHM\n")
-            logger.info("*** Finding all frequent 1-sequences ***")
 
-        """Find all frequent 1-sequences"""
-        n = len(self.ds)
-        for event in list(self.frequent_sequences):
-            support_count = len(self.frequent_sequences[event][0].set_of_indexes)
-            support = support_count / n
-            if support < self.minsup:
-                del self.frequent_sequences[event]
-            else:
-                if self.verbose:
-                    logger.info(f"Event: {event} - Support count: {support_count}")
-        self.add_frequent_sequences(output)
+        self.metrics = []
+        self.output = []
+        self.minsup = self.base_minsup
+        self.best_supports = []
+        self.pending = []
+        self.clear_reduction()
 
-        k = 2
+        k = 0
+        if self.resume_state is not None:
+            k = self.restore_checkpoint(self.resume_state)
+            if self.verbose:
+                logger.info(f"*** Resuming from level {k + 1} ***")
+            yield from self.output
+
+        if k == 0:
+            if self.verbose:
+                logger.info("*** Finding all frequent 1-sequences ***")
+
+            """Find all frequent 1-sequences"""
+            start = time.perf_counter()
+            generated = len(self.frequent_sequences)
+            n = len(self.ds)
+            for event in list(self.frequent_sequences):
+                support_count = len(self.frequent_sequences[event][0].set_of_indexes)
+                support = support_count / n
+                if support < self.minsup:
+                    del self.frequent_sequences[event]
+                else:
+                    if self.verbose:
+                        logger.info(f"Event: {event} - Support count: {support_count}")
+            if self.topk is not None:
+                self.raise_threshold()
+            self.record_level(metrics.level_metrics(1, generated, 0, len(self.frequent_sequences),
+                                                    generate_time=self.init_time,
+                                                    support_count_time=time.perf_counter() - start))
+
+            if self.engine == "vertical":
+                for event in self.frequent_sequences:
+                    self.idlists[((event,),)] = \
+                        vertical.event_idlist(self.event_positions[event], self.maxspan)
+
+            yield from self.complete_level(1)
+            if self.reduce:
+                self.reduce_dataset(1)
+            k = 1
+
+        k += 1
         """Loop until there are no more frequent k-sequences"""
         while self.frequent_sequences and (k <= self.max_k):
-            """Generate and prune all candidate k-sequences"""
-            self.generate_candidates(k)
+            if self.memory_limit is not None:
+                """Candidates are generated and counted one partition at a
+                time
+                """
+                generated, pruned, generate_time, prune_time, support_count_time = \
+                    self.run_level_partitioned(k, executor)
+            elif k == 2 and self.cooccurrence_level2:
+                """Frequent 2-sequences are found with a single pass over the
+                dataset
+                """
+                generated, pruned, generate_time, prune_time, support_count_time = self.run_level2(executor)
+            else:
+                """Generate and prune all candidate k-sequences"""
+                start = time.perf_counter()
+                self.generate_candidates(k)
+                generate_time = time.perf_counter() - start
+                generated = len(self.candidate_sequences)
+
+                start = time.perf_counter()
+                if k > 2:
+                    self.prune_candidates()
+                prune_time = time.perf_counter() - start
+                pruned = generated - len(self.candidate_sequences)
+
+                """All frequent k-1-sequences are discarded as they're not needed"""
+                for event in self.frequent_sequences:
+                    self.frequent_sequences[event].clear()
+
+                """Calculate support count and find frequence k-sequences"""
+                start = time.perf_counter()
+                self.support_count(executor)
+                support_count_time = time.perf_counter() - start
+
+            self.remove_empty_keys()
+            if self.topk is not None:
+                self.raise_threshold()
+
+            frequent = sum(len(sequence_list) for sequence_list in self.frequent_sequences.values())
+            self.record_level(metrics.level_metrics(k, generated, pruned, frequent, self.containment_checks,
+                                                    self.early_aborts, generate_time, prune_time,
+                                                    support_count_time))
+
+            """Clear candidate sequences for next iteration"""
+            self.candidate_sequences.clear()
 
-            if k > 2:
-                self.prune_candidates()
+            """All frequent k-sequences get yielded to the output"""
+            yield from self.complete_level(k)
+            if self.reduce and k < self.max_k:
+                self.reduce_dataset(k)
+
+            k += 1
+
+        """Sequences of the last level have no frequent supersequences"""
+        yield from self.pending
+
+    def run_level_partitioned(self, k, executor=None):
+        """Generate, prune and count support of candidate k-sequences one
+        partition at a time, so that the candidates of a partition take about
+        half of memory_limit; frequent k-sequences are spilled to disk
+        whenever they take more than the other half, and read back once the
+        level is completed. Return the number of candidates generated and
+        pruned, and the time spent generating, pruning and counting support
+        """
+        budget = self.memory_limit // 2
+        previous_sequences = self.frequent_sequences
+        frequent_sequences_set = self.frequent_elements() if k > 2 else None
+        current_sequences = {key: [] for key in previous_sequences}
+        current_size = 0
+        spills = 0
+
+        candidates = self.iter_candidates(k)
+        generated = pruned = containment_checks = early_aborts = 0
+        generate_time = prune_time = support_count_time = 0.0
+        with tempfile.TemporaryFile() as spill_file:
+            while True:
+                """Generate candidates until the partition is full"""
+                start = time.perf_counter()
+                partition_size = 0
+                for candidate in candidates:
+                    self.candidate_sequences.append(candidate)
+                    partition_size += sequence_size(candidate)
+                    if partition_size >= budget:
+                        break
+                generate_time += time.perf_counter() - start
+                if not self.candidate_sequences:
+                    break
+                generated += len(self.candidate_sequences)
+
+                start = time.perf_counter()
+                if k > 2:
+                    partition_generated = len(self.candidate_sequences)
+                    self.prune_candidates(frequent_sequences_set)
+                    pruned += partition_generated - len(self.candidate_sequences)
+                prune_time += time.perf_counter() - start
+
+                """Frequent candidates are added after the k-sequences found in
+                the previous partitions
+                """
+                start = time.perf_counter()
+                lengths = {key: len(sequence_list) for key, sequence_list in current_sequences.items()}
+                self.frequent_sequences = current_sequences
+                try:
+                    self.support_count(executor)
+                finally:
+                    self.frequent_sequences = previous_sequences
+                self.candidate_sequences.clear()
+                support_count_time += time.perf_counter() - start
+                containment_checks += self.containment_checks
+                early_aborts += self.early_aborts
+
+                for key, sequence_list in current_sequences.items():
+                    for sequence in sequence_list[lengths[key]:]:
+                        current_size += sequence_size(sequence)
+
+                if current_size > budget:
+                    """Frequent k-sequences found so far are moved to disk"""
+                    pickle.dump({key: [(sequence.elements, sequence.set_of_indexes.bits)
+                                       for sequence in sequence_list]
+                                 for key, sequence_list in current_sequences.items() if sequence_list},
+                                spill_file, pickle.HIGHEST_PROTOCOL)
+                    for sequence_list in current_sequences.values():
+                        sequence_list.clear()
+                    current_size = 0
+                    spills += 1
 
             """All frequent k-1-sequences are discarded as they're not needed"""
-            for event in self.frequent_sequences:
-                self.frequent_sequences[event].clear()
+            for sequence_list in previous_sequences.values():
+                sequence_list.clear()
+            frequent_sequences_set = None
 
-            """Calculate support count and find frequence k-sequences"""
-            self.support_count()
+            if spills:
+                if self.verbose:
+                    logger.info(f"*** Reading {spills} spilled partitions ***")
+                self.frequent_sequences = {key: [] for key in current_sequences}
+                spill_file.seek(0)
+                for _ in range(spills):
+                    for key, records in pickle.load(spill_file).items():
+                        self.frequent_sequences[key].extend(Sequence(elements, Bitmap(bits))
+                                                            for elements, bits in records)
+                for key, sequence_list in current_sequences.items():
+                    self.frequent_sequences[key].extend(sequence_list)
+            else:
+                self.frequent_sequences = current_sequences
+
+        self.containment_checks = containment_checks
+        self.early_aborts = early_aborts
+        return generated, pruned, generate_time, prune_time, support_count_time
+
+    def run_level2(self, executor=None):
+        """Find all frequent 2-sequences by visiting each data-sequence once
+        and counting, for each pair of frequent events, the data-sequences
+        where one occurs after the other and where both occur in the same
+        element, instead of generating and counting all candidate 2-sequences;
+        a second visit collects the data-sequences containing the frequent
+        pairs only. If an executor is given, the dataset is split in chunks
+        visited by its worker processes. With the vertical engine, the
+        id-lists of the frequent 2-sequences are built too. Return the same
+        values as run_level_partitioned, the number of distinct pairs found
+        counting as generated candidates
+        """
+        if self.verbose:
+            logger.info("*** Counting co-occurrences of frequent events ***")
 
-            """Clear candidate sequences for next iteration"""
-            self.candidate_sequences.clear()
+        start = time.perf_counter()
+        ranks = {event: rank for rank, event in enumerate(self.frequent_sequences)}
+        events = list(ranks)
+        size = len(ranks)
+        n = len(self.ds)
+        if executor is None:
+            before_counts, same_counts = cooccurrence.count_pairs(self.current_ds(), 0, n, ranks, size, self.maxgap,
+                                                                  self.mingap, self.maxspan)
+        else:
+            chunk_size = max(1, math.ceil(n / (self.workers * CHUNKS_PER_WORKER)))
+            starts = range(0, n, chunk_size)
+            stops = [min(n, i + chunk_size) for i in starts]
+            typecode = cooccurrence.count_typecode(n)
+            before_counts = array(typecode, [0]) * (size * size)
+            same_counts = array(typecode, [0]) * (size * size)
+            for chunk_before, chunk_same in executor.map(_count_pairs, starts, stops, [ranks] * len(starts)):
+                cooccurrence.add_counts(before_counts, chunk_before)
+                cooccurrence.add_counts(same_counts, chunk_same)
+        generated = 2 * size * size - before_counts.count(0) - same_counts.count(0)
+
+        """The smallest support count that reaches minsup"""
+        threshold = max(1, math.ceil(self.minsup * n))
+        while threshold > 1 and (threshold - 1) / n >= self.minsup:
+            threshold -= 1
+        while threshold / n < self.minsup:
+            threshold += 1
+
+        before_codes = set(cooccurrence.frequent_codes(before_counts, threshold))
+        same_codes = set(cooccurrence.frequent_codes(same_counts, threshold))
+        del before_counts, same_counts
+
+        """Only events in frequent pairs are considered by the second visit"""
+        pair_ranks = set()
+        for code in before_codes | same_codes:
+            pair_ranks.update(divmod(code, size))
+        pair_events = {event: rank for event, rank in ranks.items() if rank in pair_ranks}
+        if not pair_events:
+            before_indexes, same_indexes = {}, {}
+        elif executor is None:
+            before_indexes, same_indexes = cooccurrence.collect_pairs(self.current_ds(), 0, n, pair_events, size,
+                                                                      before_codes, same_codes, self.maxgap,
+                                                                      self.mingap, self.maxspan)
+        else:
+            before_indexes = {}
+            same_indexes = {}
+            for chunk_before, chunk_same in executor.map(_collect_pairs, starts, stops,
+                                                         [pair_events] * len(starts), [size] * len(starts),
+                                                         [before_codes] * len(starts), [same_codes] * len(starts)):
+                for indexes, chunk_indexes in ((before_indexes, chunk_before), (same_indexes, chunk_same)):
+                    for code, code_indexes in chunk_indexes.items():
+                        indexes.setdefault(code, []).extend(code_indexes)
+
+        """Frequent 2-sequences are stored in the order generate_candidates
+        would generate them: for each pair of positions i <= j of frequent
+        events a, b, <(a)(b)>, then <(b)(a)> and <(a b)>
+        """
+        found = []
+        for code, indexes in before_indexes.items():
+            a, b = divmod(code, size)
+            order = (a, b, 0) if a <= b else (b, a, 1)
+            found.append((order, ((events[a],), (events[b],)), indexes))
+        for code, indexes in same_indexes.items():
+            a, b = divmod(code, size)
+            found.append(((a, b, 2), (tuple(sorted((events[a], events[b]))),), indexes))
+        found.sort(key=lambda sequence: sequence[0])
+
+        for event in self.frequent_sequences:
+            self.frequent_sequences[event].clear()
+        for _, elements, indexes in found:
+            sequence = Sequence(elements, Bitmap.from_indexes(indexes))
+            self.frequent_sequences[elements[0][0]].append(sequence)
 
-            """All frequent k-1-sequences get printed to the output"""
-            self.add_frequent_sequences(output)
+            if self.verbose:
+                logger.info(f"Sequence: {sequence.elements}")
+                logger.info(f"Support count: {len(sequence.set_of_indexes)}")
 
-            k += 1
+        if self.engine == "vertical":
+            """Id-lists are only built for frequent 2-sequences, joining the
+            id-list of the first event in the data-sequences containing them
+            """
+            idlists = {}
+            for _, elements, indexes in found:
+                prefix_idlist = self.idlists[(elements[0][:1],)]
+                idlists[elements] = self.join_idlist(elements, {index: prefix_idlist[index] for index in indexes})
+            self.idlists = idlists
+
+        self.containment_checks = 0
+        self.early_aborts = 0
+        return generated, 0, 0.0, 0.0, time.perf_counter() - start
+
+    def reduce_dataset(self, k):
+        """Rewrite the dataset used for containment checks once the frequent
+        k-sequences are known: the events not contained in any of them can't
+        be contained in any candidate of the following levels, and without
+        time constraints (as positions matter otherwise) they're removed from
+        all elements, together with the elements left empty; the
+        data-sequences with at most k of those events or containing no
+        frequent k-sequence are emptied and excluded from the candidates'
+        sets of indexes. The indexes of data-sequences don't change
+        """
+        if not self.frequent_sequences:
+            return
 
-        return output
+        events = set()
+        active = Bitmap()
+        for sequence_list in self.frequent_sequences.values():
+            for sequence in sequence_list:
+                active = active | sequence.set_of_indexes
+                for element in sequence.elements:
+                    events.update(element)
+        if self.active_indexes is not None:
+            active = active & self.active_indexes
+
+        kept = []
+        if self.has_time_constraints():
+            """Position indexes are looked up by event, so removing events
+            from them wouldn't speed up containment checks: data-sequences
+            are only excluded from the candidates' sets of indexes
+            """
+            targets = self.containment_targets()
+            for index in active:
+                if sum(len(event_positions) for event, event_positions in targets[index].items()
+                       if event in events) > k:
+                    kept.append(index)
+        else:
+            dataset = self.current_ds()
+            compact = isinstance(self.ds, CompactDataset)
+            if compact:
+                """Data-sequences are appended one at a time, emptied ones
+                included, so that no nested-list copy of the dataset is built
+                """
+                reduced = CompactDataset()
+            else:
+                reduced = [[]] * len(self.ds)
+            for index in active:
+                sequence = [[event for event in element if event in events] for element in dataset[index]]
+                sequence = [element for element in sequence if element]
+                if sum(len(element) for element in sequence) <= k:
+                    sequence = []
+                else:
+                    kept.append(index)
+
+                if compact:
+                    while len(reduced) < index:
+                        reduced.append([])
+                    reduced.append(sequence)
+                else:
+                    reduced[index] = sequence
+
+            if compact:
+                while len(reduced) < len(self.ds):
+                    reduced.append([])
+            self.reduced_ds = reduced
+        self.active_indexes = Bitmap.from_indexes(kept)
+
+        if self.verbose:
+            logger.info(f"*** Dataset reduced to {len(kept)} data-sequences and {len(events)} events ***")
+
+    def clear_reduction(self):
+        """Restore the dataset used for containment checks to the whole one"""
+        self.reduced_ds = None
+        self.active_indexes = None
+
+    def current_ds(self):
+        """Return the dataset as rewritten by reduce_dataset, if it was,
+        otherwise the dataset itself
+        """
+        return self.ds if self.reduced_ds is None else self.reduced_ds
+
+    def raise_threshold(self):
+        """Add the support counts of the current frequent sequences to the
+        best ones found so far, raise minsup to the support of the topk-th
+        best sequence and remove the frequent sequences below it
+        """
+        n = len(self.ds)
+        for sequence_list in self.frequent_sequences.values():
+            for sequence in sequence_list:
+                support_count = len(sequence.set_of_indexes)
+                if len(self.best_supports) < self.topk:
+                    heapq.heappush(self.best_supports, support_count)
+                elif support_count > self.best_supports[0]:
+                    heapq.heapreplace(self.best_supports, support_count)
+
+        if len(self.best_supports) == self.topk and self.best_supports[0] / n > self.minsup:
+            self.minsup = self.best_supports[0] / n
+            if self.verbose:
+                logger.info(f"*** Threshold raised to {self.minsup} ***")
+
+            for key, sequence_list in self.frequent_sequences.items():
+                self.frequent_sequences[key] = [sequence for sequence in sequence_list
+                                                if len(sequence.set_of_indexes) / n >= self.minsup]
+            self.remove_empty_keys()
+
+    def complete_level(self, k):
+        """Return the frequent sequences found at level k (paired with their
+        support count), writing a checkpoint if needed; with the closed and
+        maximal output modes, the sequences of level k-1 that have no
+        (equally) frequent supersequence at level k are returned instead
+        """
+        if self.checkpoint_filename is None and self.output_mode == "all":
+            return self.iter_frequent_sequences()
+
+        level_output = list(self.iter_frequent_sequences())
+        if self.output_mode != "all":
+            level_output, self.pending = self.filter_pending(), level_output
+
+        if self.checkpoint_filename is None:
+            return level_output
+        self.output.extend(level_output)
+        self.write_checkpoint(k)
+        return level_output
+
+    def filter_pending(self):
+        """Return the sequences of the previous level which are closed (or
+        maximal), given the current frequent sequences
+        """
+        contiguous = self.maxgap != math.inf
+        covered = set()
+        for sequence_list in self.frequent_sequences.values():
+            for sequence in sequence_list:
+                support_count = len(sequence.set_of_indexes)
+                for subsequence in subsequences(sequence.elements, contiguous):
+                    if self.output_mode == "closed":
+                        covered.add((subsequence, support_count))
+                    else:
+                        covered.add(subsequence)
+
+        if self.output_mode == "closed":
+            return [(elements, support_count) for elements, support_count in self.pending
+                    if (elements, support_count) not in covered]
+        return [(elements, support_count) for elements, support_count in self.pending
+                if elements not in covered]
+
+    def checkpoint_parameters(self):
+        """Return the parameters a checkpoint must have been written with to
+        be resumed by this instance
+        """
+        if self.fingerprint is None:
+            self.fingerprint = checkpoint.dataset_fingerprint(self.ds)
+        return {"minsup": self.base_minsup, "topk": self.topk, "output_mode": self.output_mode,
+                "max_k": self.max_k, "maxgap": self.maxgap, "mingap": self.mingap, "maxspan": self.maxspan,
+                "engine": self.engine, "dataset": self.fingerprint}
+
+    def write_checkpoint(self, k):
+        """Write the state of the run at the end of level k to the checkpoint
+        file
+        """
+        frequent_sequences = {key: [(sequence.elements, sequence.set_of_indexes.bits) for sequence in sequence_list]
+                              for key, sequence_list in self.frequent_sequences.items()}
+        checkpoint.write_checkpoint(self.checkpoint_filename, {
+            "parameters": self.checkpoint_parameters(),
+            "k": k,
+            "frequent_sequences": frequent_sequences,
+            "idlists": self.idlists,
+            "output": self.output,
+            "pending": self.pending,
+            "metrics": self.metrics,
+        })
+
+    def read_checkpoint(self):
+        """Return the state stored in the checkpoint file, checking that it
+        was written with the same parameters and dataset
+        """
+        state = checkpoint.read_checkpoint(self.checkpoint_filename)
+        if state["parameters"] != self.checkpoint_parameters():
+            raise ValueError(f"{self.checkpoint_filename} was written with different parameters or dataset")
+        return state
+
+    def restore_checkpoint(self, state):
+        """Restore the state of the run from a checkpoint, returning the last
+        level recorded in it
+        """
+        self.frequent_sequences = {key: [Sequence(elements, Bitmap(bits)) for elements, bits in sequence_list]
+                                   for key, sequence_list in state["frequent_sequences"].items()}
+        self.idlists = state["idlists"]
+        self.output = state["output"]
+        self.pending = state["pending"]
+        self.metrics = state["metrics"]
+
+        if self.topk is not None:
+            """The best support counts are the ones of the output so far"""
+            self.best_supports = heapq.nlargest(self.topk, (support_count for _, support_count in self.output))
+            heapq.heapify(self.best_supports)
+            if len(self.best_supports) == self.topk:
+                self.minsup = max(self.minsup, self.best_supports[0] / len(self.ds))
+        return state["k"]
+
+    def record_level(self, level):
+        """Store the metrics of a completed level and pass them to the
+        callback
+        """
+        self.metrics.append(level)
+        if self.callback is not None:
+            self.callback(level)
 
     def generate_candidates(self, k):
         """Generate all candidate k-sequences from frequent k-1-sequences"""
+        self.candidate_sequences.extend(self.iter_candidates(k))
+
+    def iter_candidates(self, k):
+        """Yield all candidate k-sequences generated from frequent
+        k-1-sequences, in the same order as generate_candidates
+        """
         if self.verbose:
             logger.info(f"*** Generating candidate {k}-sequences ***")
 
+        frequent_sequences = self.frequent_sequences
         frequent_sequences_list = []
-        for value in self.frequent_sequences.values():
+        for value in frequent_sequences.values():
             frequent_sequences_list.extend(value)
 
         n = len(self.ds)
@@ -117,11 +878,17 @@ class GSP:
                         if len(new_set_of_indexes) / n < self.minsup:
                             continue
 
+                    if self.active_indexes is not None:
+                        """Data-sequences emptied by reduce_dataset can't
+                        contain the candidate
+                        """
+                        new_set_of_indexes = new_set_of_indexes & self.active_indexes
+
                     """Adds candidate [[event1], [event2]]"""
-                    new_elements1 = [[event1], [event2]]
+                    new_elements1 = ((event1,), (event2,))
 
                     new_candidate1 = Sequence(new_elements1, new_set_of_indexes)
-                    self.candidate_sequences.append(new_candidate1)
+                    yield new_candidate1
 
                     if self.verbose:
                         logger.info(f"{new_candidate1.elements}")
@@ -132,95 +899,68 @@ class GSP:
                         """
 
                         """Adds candidate [[event2], [event1]]"""
-                        new_elements2 = [[event2], [event1]]
+                        new_elements2 = ((event2,), (event1,))
 
-                        new_candidate2 = Sequence(new_elements2, set(new_set_of_indexes))
-                        self.candidate_sequences.append(new_candidate2)
+                        new_candidate2 = Sequence(new_elements2, new_set_of_indexes)
+                        yield new_candidate2
 
                         """Adds [[event1, event2]] or [[event2, event1]], depending
                         on which is greater than the other
                         """
                         if event1 < event2:
-                            new_elements3 = [[event1, event2]]
+                            new_elements3 = ((event1, event2),)
                         else:
-                            new_elements3 = [[event2, event1]]
+                            new_elements3 = ((event2, event1),)
 
-                        new_candidate3 = Sequence(new_elements3, set(new_set_of_indexes))
-                        self.candidate_sequences.append(new_candidate3)
+                        new_candidate3 = Sequence(new_elements3, new_set_of_indexes)
+                        yield new_candidate3
 
                         if self.verbose:
                             logger.info(f"{new_candidate2.elements}")
                             logger.info(f"{new_candidate3.elements}")
 
         else:
+            """Two k-1-sequences can be merged if removing the first event of
+            the first one and the last event of the second one gives the same
+            subsequence: the sequences are indexed by the latter, so that each
+            sequence is only paired with the ones it can be merged with
+            """
+            join_index = {}
+            for sequence2 in frequent_sequences_list:
+                join_index.setdefault(sequence2.drop_last(), []).append(sequence2)
+
             for sequence1 in frequent_sequences_list:
-                if len(sequence1.elements[0]) > 1:
-                    key = sequence1.elements[0][1]
-                    starting_elem = 0
-                else:
-                    """If the first element has only one event, pick the first
-                    event from the second element
+                for sequence2 in join_index.get(sequence1.drop_first(), ()):
+                    """If the merged candidate has too few possible sequences
+                    it could be contained in, it's immediately discarded
                     """
-                    key = sequence1.elements[1][0]
-                    starting_elem = 1
-
-                """Only the sequences that could potentially be merged with the
-                current one get picked
-                """
-                if key not in self.frequent_sequences:
-                    continue
-
-                for sequence2 in self.frequent_sequences[key]:
-                    if k == 3 or self.check_if_mergeable(sequence1.elements, sequence2.elements, starting_elem):
-                        """If the merged candidate has too few possible sequences
-                        it could be contained in, it's immediately discarded
-                        """
-                        new_set_of_indexes = \
-                            sequence1.set_of_indexes.intersection(sequence2.set_of_indexes)
-                        if len(new_set_of_indexes) / n < self.minsup:
-                            continue
-
-                        new_elements = deepcopy(sequence1.elements)
-
-                        if len(sequence2.elements[-1]) == 1:
-                            new_elements.append(list(sequence2.elements[-1]))
-                        else:
-                            new_elements[-1].append(sequence2.elements[-1][-1])
-
-                        new_candidate = Sequence(new_elements, new_set_of_indexes)
-                        self.candidate_sequences.append(new_candidate)
-
-                        if self.verbose:
-                            logger.info(f"{new_candidate.elements}")
-
-    def check_if_mergeable(self, sequence1, sequence2, starting_elem1):
-        """Check if k-1-sequence1 can be merged with k-1-sequence2 to produce a
-        candidate k-sequence"""
-        if len(sequence1) == 1 and len(sequence2) == 1:
-            if sequence1[0][1:] != sequence2[0][:-1]:
-                return False
-            return True
-
-        if starting_elem1 == 0:
-            if sequence1[0][1:] != sequence2[0]:
-                return False
-            start = 1
-        else:
-            start = 0
+                    new_set_of_indexes = \
+                        sequence1.set_of_indexes.intersection(sequence2.set_of_indexes)
+                    if self.active_indexes is not None:
+                        new_set_of_indexes = new_set_of_indexes & self.active_indexes
+                    if len(new_set_of_indexes) / n < self.minsup:
+                        continue
 
-        for i in range(start, len(sequence2) - 1):
-            if sequence1[i + starting_elem1] != sequence2[i]:
-                return False
+                    """The new candidate shares all elements of sequence1
+                    (but the last one, if it's extended) and of sequence2
+                    """
+                    if len(sequence2.elements[-1]) == 1:
+                        new_elements = sequence1.elements + (sequence2.elements[-1],)
+                    else:
+                        new_elements = sequence1.elements[:-1] + \
+                            (sequence1.elements[-1] + (sequence2.elements[-1][-1],),)
 
-        if len(sequence2[-1]) > 1:
-            if sequence1[-1] != sequence2[-1][:-1]:
-                return False
+                    new_candidate = Sequence(new_elements, new_set_of_indexes)
+                    yield new_candidate
 
-        return True
+                    if self.verbose:
+                        logger.info(f"{new_candidate.elements}")
 
-    def prune_candidates(self):
+    def prune_candidates(self, frequent_sequences_set=None):
         """Prune all candidate k-sequences who contain at least one infrequent
-        k-1-subsequence"""
+        k-1-subsequence; frequent_sequences_set is the set of the elements of
+        all frequent k-1-sequences, built from frequent_sequences if not given
+        """
         if self.verbose:
             logger.info("*** Pruning candidates ***")
 
@@ -232,7 +972,14 @@ class GSP:
         else:
             prune = self.prune_with_time_constraints
 
-        for candidate in list(self.candidate_sequences):
+        """Frequent k-1-sequences are indexed once, so that each subsequence
+        check is a single lookup
+        """
+        if frequent_sequences_set is None:
+            frequent_sequences_set = self.frequent_elements()
+
+        pruned_candidates = []
+        for candidate in self.candidate_sequences:
             if self.verbose:
                 logger.info(f"Candidate: {candidate.elements}")
 
@@ -246,16 +993,20 @@ class GSP:
                 starting_elem = 1
                 starting_event = 0
 
-            key = candidate.elements[0][0]
+            if prune(candidate.elements, starting_elem, starting_event, frequent_sequences_set):
+                pruned_candidates.append(candidate)
 
-            frequent_sequences_list = []
-            for sequence in self.frequent_sequences[key]:
-                frequent_sequences_list.append(sequence.elements)
+        self.candidate_sequences = pruned_candidates
 
-            if not prune(candidate.elements, starting_elem, starting_event, frequent_sequences_list):
-                self.candidate_sequences.remove(candidate)
+    def frequent_elements(self):
+        """Return the set of the elements of all current frequent sequences"""
+        frequent_sequences_set = set()
+        for sequence_list in self.frequent_sequences.values():
+            for sequence in sequence_list:
+                frequent_sequences_set.add(sequence.elements)
+        return frequent_sequences_set
 
-    def prune_without_time_constraints(self, candidate, starting_elem, starting_event, frequent_sequences_list):
+    def prune_without_time_constraints(self, candidate, starting_elem, starting_event, frequent_sequences_set):
         """Check if candidate sequence contains at least one infrequent
         subsequence
         """
@@ -270,37 +1021,31 @@ class GSP:
                     """
                     return True
 
-                """flag is used to mark whether a single event or a whole
-                element was removed from the candidate so it can be later
-                reinserted
+                """If the element has only one event, the whole element is
+                removed from the candidate
                 """
                 if last_event == 1:
-                    popped_item = candidate.pop(curr_elem)
+                    subsequence = candidate[:curr_elem] + candidate[curr_elem + 1:]
                 else:
-                    popped_item = candidate[curr_elem].pop(curr_event)
+                    subsequence = remove_event(candidate, curr_elem, curr_event)
 
                 if self.verbose:
-                    logger.info(f"\tSubsequence: {candidate}")
+                    logger.info(f"\tSubsequence: {subsequence}")
 
-                if candidate not in frequent_sequences_list:
+                if subsequence not in frequent_sequences_set:
                     """If one of the k-1 subsequences is infrequent, the
                     candidate is pruned
                     """
                     if self.verbose:
                         logger.info("\tInfrequent")
                     return False
-
-                if last_event == 1:
-                    candidate.insert(curr_elem, popped_item)
-                else:
-                    candidate[curr_elem].insert(curr_event, popped_item)
             starting_event = 0
 
         if self.verbose:
             logger.info("\tAll subsequences are frequent")
         return True
 
-    def prune_with_time_constraints(self, candidate, starting_elem, starting_event, frequent_sequences_list):
+    def prune_with_time_constraints(self, candidate, starting_elem, starting_event, frequent_sequences_set):
         """Check if candidate sequence contains at least one infrequent
         contiguous subsequence
         """
@@ -319,57 +1064,260 @@ class GSP:
                     """
                     return True
 
-                popped_item = candidate[curr_elem].pop(curr_event)
+                subsequence = remove_event(candidate, curr_elem, curr_event)
 
                 if self.verbose:
-                    logger.info(f"\tSubsequence: {candidate}")
+                    logger.info(f"\tSubsequence: {subsequence}")
 
-                if candidate not in frequent_sequences_list:
+                if subsequence not in frequent_sequences_set:
                     """If one of the k-1 subsequences is infrequent, the
                     candidate is pruned
                     """
                     if self.verbose:
                         logger.info("\tInfrequent")
                     return False
-
-                candidate[curr_elem].insert(curr_event, popped_item)
             starting_event = 0
 
         if self.verbose:
             logger.info("\tAll contiguous subsequences are frequent")
         return True
 
-    def support_count(self):
+    def support_count(self, executor=None):
         """Calculate support count for all k-candidates, add all frequent ones
-        to frequent_sequences
+        to frequent_sequences; if an executor is given, candidates are split
+        in chunks that are counted by its worker processes
         """
         if self.verbose:
             logger.info("*** Calculating support count ***")
             logger.info("*** Frequent sequences found: ***")
 
-        if (self.maxgap == math.inf) and (self.mingap == 0) and (self.maxspan == math.inf):
+        self.containment_checks = 0
+        self.early_aborts = 0
+
+        if self.engine == "vertical":
+            self.support_count_vertical()
+            return
+
+        contained, self.containment_checks = self.count_candidates(self.candidate_sequences, executor)
+        self.early_aborts = contained.count(None)
+
+        self.add_frequent_candidates(contained)
+
+    def count_candidates(self, candidates, executor=None):
+        """Return the containing data-sequences of each candidate, as returned
+        by find_containing_sequences, and the number of containment checks
+        performed; if an executor is given, candidates are split in chunks
+        that are counted by its worker processes (data-sequences are split in
+        ranges instead with the hash-tree engine)
+        """
+        if executor is None:
+            return self.find_containing_sequences(candidates)
+
+        if self.engine == "hashtree":
+            return self.count_candidates_by_range(candidates, executor)
+
+        chunk_size = max(1, math.ceil(len(candidates) / (self.workers * CHUNKS_PER_WORKER)))
+        chunks = [candidates[i:i + chunk_size] for i in range(0, len(candidates), chunk_size)]
+        contained = []
+        checks = 0
+        for chunk_contained, chunk_checks in executor.map(_find_containing_sequences, chunks):
+            contained.extend(chunk_contained)
+            checks += chunk_checks
+        return contained, checks
+
+    def count_candidates_by_range(self, candidates, executor):
+        """Count candidates with the hash-tree engine in the worker processes
+        of executor, each visiting a range of data-sequences with the
+        hash-tree of all candidates; return the same as count_candidates
+        """
+        n = len(self.ds)
+        range_size = max(1, math.ceil(n / (self.workers * CHUNKS_PER_WORKER)))
+        starts = range(0, n, range_size)
+        stops = [min(n, start + range_size) for start in starts]
+        contained = [[] for _ in candidates]
+        checks = 0
+        for range_contained, range_checks in executor.map(_find_containing_sequences_range, [candidates] * len(starts),
+                                                          starts, stops):
+            checks += range_checks
+            for position, indexes in enumerate(range_contained):
+                if indexes is None or contained[position] is None:
+                    contained[position] = None
+                else:
+                    contained[position].extend(indexes)
+        return contained, checks
+
+    def add_frequent_candidates(self, contained):
+        """Add all frequent k-candidates to frequent_sequences, given the
+        containing data-sequences of each candidate (a list of indexes or a
+        Bitmap, or None if the candidate is known to be infrequent)
+        """
+        n = len(self.ds)
+        for candidate, indexes in zip(self.candidate_sequences, contained):
+            if indexes is None or len(indexes) / n < self.minsup:
+                continue
+
+            if isinstance(indexes, Bitmap):
+                candidate.set_of_indexes = indexes
+            else:
+                candidate.set_of_indexes = Bitmap.from_indexes(indexes)
+
+            self.frequent_sequences[candidate.elements[0][0]].append(candidate)
+
+            if self.verbose:
+                logger.info(f"Sequence: {candidate.elements}")
+                logger.info(f"Support count: {len(candidate.set_of_indexes)}")
+
+    def has_time_constraints(self):
+        """Check if any time constraint is set"""
+        return self.maxgap != math.inf or self.mingap != 0 or self.maxspan != math.inf
+
+    def containment_targets(self):
+        """Return the data-sequences as expected by the containment check
+        function: with time constraints, the position index of each
+        data-sequence, otherwise the dataset itself
+        """
+        if self.has_time_constraints():
+            if len(self.position_indexes) < len(self.ds):
+                """The index isn't built in advance for the vertical engine"""
+                self.position_indexes.extend(positions.build_position_index(self.ds[index])
+                                             for index in range(len(self.position_indexes), len(self.ds)))
+            return self.position_indexes
+        return self.current_ds()
+
+    def select_is_contained(self):
+        """Return the containment check function to use with the given time
+        constraints
+        """
+        if not self.has_time_constraints():
             is_contained = self.is_contained_without_time_constraints
         else:
             is_contained = self.is_contained_with_time_constraints
 
+        if self.verbose:
+            is_contained = log_containment(is_contained)
+        return is_contained
+
+    def find_containing_sequences(self, candidates):
+        """Return, for each candidate, the list of indexes of the data-sequences
+        containing it (or None if the candidate was found to be infrequent
+        before all of them were checked), and the number of containment checks
+        performed
+        """
+        is_contained = self.select_is_contained()
+
+        if self.engine == "hashtree":
+            return self.find_containing_sequences_hashtree(candidates, is_contained)
+
+        targets = self.containment_targets()
         n = len(self.ds)
-        for candidate in self.candidate_sequences:
-            infrequent = False
-            for index in list(candidate.set_of_indexes):
-                if not is_contained(candidate.elements, self.ds[index]):
-                    candidate.set_of_indexes.discard(index)
-                    if len(candidate.set_of_indexes) / n < self.minsup:
-                        infrequent = True
+        result = []
+        checks = 0
+        for candidate in candidates:
+            remaining = len(candidate.set_of_indexes)
+            contained = []
+            for index in candidate.set_of_indexes:
+                checks += 1
+                if is_contained(candidate.elements, targets[index]):
+                    contained.append(index)
+                else:
+                    remaining -= 1
+                    if remaining / n < self.minsup:
+                        contained = None
                         break
-            if infrequent:
+            result.append(contained)
+        return result, checks
+
+    def find_containing_sequences_hashtree(self, candidates, is_contained, start=0, stop=None):
+        """Return, for each candidate, the list of indexes of the data-sequences
+        containing it (or None if the candidate was found to be infrequent
+        before all of them were checked) and the number of containment checks
+        performed, storing candidates in a hash-tree and checking each
+        data-sequence only against the candidates in the leaves it reaches
+        that occur in it (by their set_of_indexes); only data-sequences from
+        start (included) to stop (excluded) are visited, all of them if stop
+        is None
+        """
+        n = len(self.ds)
+        if stop is None:
+            stop = n
+
+        """Each candidate's set_of_indexes is converted to bytes, so that
+        testing an index takes constant time; remaining counts the
+        data-sequences that may still contain the candidate, failed checks in
+        other ranges aside, so that it can be discarded early as in
+        find_containing_sequences
+        """
+        tree = HashTree()
+        candidate_indexes = Bitmap()
+        size = (n + 7) >> 3
+        states = {}
+        for candidate in candidates:
+            tree.insert(candidate)
+            candidate_indexes = candidate_indexes | candidate.set_of_indexes
+            states[id(candidate)] = [candidate.set_of_indexes.bits.to_bytes(size, "little"),
+                                     len(candidate.set_of_indexes), []]
+        if start > 0 or stop < n:
+            candidate_indexes = candidate_indexes & Bitmap.from_range(start, stop)
+
+        dataset = self.current_ds()
+        targets = self.containment_targets()
+        checks = 0
+        for index in candidate_indexes:
+            sequence = dataset[index]
+            target = targets[index]
+            byte_index = index >> 3
+            bit = 1 << (index & 7)
+            for leaf in tree.leaves(sequence):
+                for candidate, _ in leaf.candidates:
+                    state = states[id(candidate)]
+                    if not state[0][byte_index] & bit or state[2] is None:
+                        continue
+                    checks += 1
+                    if is_contained(candidate.elements, target):
+                        state[2].append(index)
+                    else:
+                        state[1] -= 1
+                        if state[1] / n < self.minsup:
+                            state[2] = None
+
+        return [states[id(candidate)][2] for candidate in candidates], checks
+
+    def support_count_vertical(self):
+        """Calculate support count for all k-candidates by joining the id-list
+        of each candidate's prefix (the candidate without its last event) with
+        the positions of its last event, add all frequent ones to
+        frequent_sequences
+        """
+        n = len(self.ds)
+        idlists = {}
+        for candidate in self.candidate_sequences:
+            idlist = self.join_idlist(candidate.elements, self.idlists[candidate.drop_last()])
+            if len(idlist) / n < self.minsup:
                 continue
 
+            candidate.set_of_indexes = Bitmap.from_indexes(idlist)
+            idlists[candidate.elements] = idlist
             self.frequent_sequences[candidate.elements[0][0]].append(candidate)
 
             if self.verbose:
                 logger.info(f"Sequence: {candidate.elements}")
                 logger.info(f"Support count: {len(candidate.set_of_indexes)}")
 
+        """Id-lists of k-1-sequences are no longer needed"""
+        self.idlists = idlists
+
+    def join_idlist(self, elements, prefix_idlist):
+        """Return the id-list of the sequence with the given elements, given
+        the id-list of its prefix (the sequence without its last event)
+        """
+        last_element = elements[-1]
+        event = last_element[-1]
+        if len(last_element) == 1:
+            return vertical.join_new_element(prefix_idlist, self.event_positions[event],
+                                             self.maxgap, self.mingap, self.maxspan)
+        return vertical.join_same_element(prefix_idlist, self.event_positions[event])
+
+    def remove_empty_keys(self):
         """Keys paired to an empty list are removed from frequent_sequences"""
         for event in list(self.frequent_sequences):
             if not self.frequent_sequences[event]:
@@ -377,19 +1325,10 @@ class GSP:
 
     def is_contained_without_time_constraints(self, c, s):
         """Check if candidate c is contained in sequence s"""
-        if self.verbose:
-            logger.info(f"Checking if {c} is in {s}")
-
         c_iter = iter(c)
         c_element = next(c_iter)
         for s_element in s:
-            if self.verbose:
-                logger.info(f"Checking elements: {c_element} in {s_element}")
-
             if set(c_element).issubset(s_element):
-                if self.verbose:
-                    logger.info(f"Yes")
-
                 if not (c_element := next(c_iter, [])):
                     """If next returns empty list (default value), all of the
                     elements of the candidate have been found
@@ -398,81 +1337,116 @@ class GSP:
         return False
 
     def is_contained_with_time_constraints(self, c, s):
-        """Check if candidate c is contained in sequence s"""
-        if self.verbose:
-            logger.info(f"Checking if {c} is in {s}")
+        """Check if candidate c is contained in sequence s, given as its
+        position index (see containment_targets)
+        """
+        return positions.is_contained(c, s, self.maxgap, self.mingap, self.maxspan)
 
-        for start, s_element in enumerate(s):
-            """Check starts at first occurrence of the candidate's first element;
-            if not found, check continues from next occurrence
-            """
-            if set(c[0]).issubset(s_element):
-                """Start of ''Forward phase'' from first element"""
-                if self.verbose:
-                    logger.info(f"Found {c[0]} at index {start}")
+    def add_frequent_sequences(self, output):
+        """Add current frequent sequences to output list"""
+        output.extend(self.iter_frequent_sequences())
 
-                gap = 0
-                j = 1
-                i = start + 1
-                """last_found and last_gap are used to recover information
-                about the state of the check for the previous element
-                """
-                last_found = 0
-                last_gap = 0
+    def iter_frequent_sequences(self):
+        """Yield current frequent sequences paired with their support count"""
+        for sequence_list in self.frequent_sequences.values():
+            for sequence in sequence_list:
+                yield sequence.elements, len(sequence.set_of_indexes)
 
-                while i < len(s) and j < len(c):
 
-                    gap += 1
+def _init_worker(gsp):
+    """Store the GSP instance used by the current worker process"""
+    global _worker_gsp
+    _worker_gsp = gsp
 
-                    if (i - start) > self.maxspan:
-                        """Start of ''backward phase'' for maxspan violation,
-                        check has to restart from the candidate's first
-                        element
-                        """
-                        if self.verbose:
-                            logger.info("maxspan constraint violated")
-                            break
 
-                    if gap > self.maxgap:
-                        """Start of ''backward phase'' for maxgap violation"""
-                        if self.verbose:
-                            logger.info("maxgap constraint violated")
-
-                        if j == 1:
-                            """Current element is the second one, restart search
-                            from first (outside of loop)
-                            """
-                            break
-                        j -= 1
-                        i = last_found + 1
-                        gap = last_gap
-                        continue
+def _find_containing_sequences(candidates):
+    """Find the data-sequences containing each candidate in a worker process"""
+    return _worker_gsp.find_containing_sequences(candidates)
 
-                    if self.verbose:
-                        logger.info(f"Checking {c[j]} in {s[i]}")
 
-                    if set(c[j]).issubset(s[i]) and (gap > self.mingap):
-                        last_found = i
-                        last_gap = gap
-                        gap = 0
-                        j += 1
-                    i += 1
+def _find_containing_sequences_range(candidates, start, stop):
+    """Find the data-sequences from start to stop containing each candidate
+    in a worker process, with the hash-tree engine
+    """
+    return _worker_gsp.find_containing_sequences_hashtree(candidates, _worker_gsp.select_is_contained(), start, stop)
 
-                if j == len(c):
-                    return True
-        return False
 
-    def add_frequent_sequences(self, output):
-        """Add current frequent sequences to output list"""
-        for sequence_list in self.frequent_sequences.values():
-            for sequence in sequence_list:
-                output.append((sequence.elements, len(sequence.set_of_indexes)))
+def _count_pairs(start, stop, ranks):
+    """Count the co-occurrences of the given events in the data-sequences
+    from start to stop in a worker process (see cooccurrence.count_pairs)
+    """
+    return cooccurrence.count_pairs(_worker_gsp.ds, start, stop, ranks, len(ranks), _worker_gsp.maxgap,
+                                    _worker_gsp.mingap, _worker_gsp.maxspan)
+
+
+def _collect_pairs(start, stop, ranks, size, before_codes, same_codes):
+    """Collect the data-sequences from start to stop containing the given
+    pairs in a worker process (see cooccurrence.collect_pairs)
+    """
+    return cooccurrence.collect_pairs(_worker_gsp.ds, start, stop, ranks, size, before_codes, same_codes,
+                                      _worker_gsp.maxgap, _worker_gsp.mingap, _worker_gsp.maxspan)
+
 
+def log_containment(is_contained):
+    """Return a version of containment check function is_contained that logs
+    each check and its result
+    """
+    def logged_is_contained(c, s):
+        result = is_contained(c, s)
+        logger.info(f"Checking if {c} is in {s}: {'Yes' if result else 'No'}")
+        return result
+    return logged_is_contained
+
+
+def sequence_size(sequence):
+    """Return an estimate of the memory taken by sequence (and by its set of
+    indexes), in bytes
+    """
+    return sys.getsizeof(sequence) + sys.getsizeof(sequence.set_of_indexes) + \
+        sys.getsizeof(sequence.set_of_indexes.bits) + sys.getsizeof(sequence.elements) + \
+        sum(sys.getsizeof(element) for element in sequence.elements)
 
-def load_ds(input_filename):
+
+def freeze(elements):
+    """Return a hashable copy of the given sequence elements"""
+    return tuple(tuple(element) for element in elements)
+
+
+def subsequences(elements, contiguous=False):
+    """Yield the subsequences of the given sequence elements obtained by
+    removing one event; if contiguous is True, only contiguous subsequences
+    are yielded (an event can't be removed from an element with a single
+    event, unless it's the first or last one)
+    """
+    last_elem = len(elements) - 1
+    for curr_elem, element in enumerate(elements):
+        if len(element) == 1:
+            if contiguous and 0 < curr_elem < last_elem:
+                continue
+            yield elements[:curr_elem] + elements[curr_elem + 1:]
+        else:
+            for curr_event in range(len(element)):
+                yield remove_event(elements, curr_elem, curr_event)
+
+
+def remove_event(elements, elem_index, event_index):
+    """Return a copy of the given sequence elements without the event at
+    position event_index of element elem_index
+    """
+    element = elements[elem_index]
+    new_element = element[:event_index] + element[event_index + 1:]
+    return elements[:elem_index] + (new_element,) + elements[elem_index + 1:]
+
+
+def load_ds(input_filename, compact=False, workers=1):
     """Return the sequence dataset contained in input_filename, converting
-    all events found to integers
+    all events found to integers; if compact is True, the dataset is returned
+    as a CompactDataset. With workers > 1, the file is parsed in parallel by
+    load_ds_parallel.
     """
+    if workers > 1:
+        return load_ds_parallel(input_filename, compact, workers)
+
     try:
         path = open(input_filename, 'r')
     except FileNotFoundError:
@@ -482,7 +1456,7 @@ def load_ds(input_filename):
     str_to_int_dict = {}
     int_to_str_dict = {}
 
-    dataset = []
+    dataset = CompactDataset() if compact else []
     sequence = []
     element = []
 
@@ -512,14 +1486,151 @@ def load_ds(input_filename):
     return dataset, int_to_str_dict, str_to_int_dict
 
 
+def load_ds_parallel(input_filename, compact=False, workers=os.cpu_count()):
+    """Return the sequence dataset contained in input_filename like load_ds:
+    the file is split in chunks of whole data-sequences, parsed by workers
+    processes, and the events of each chunk are then converted to the same
+    integers load_ds would assign (in order of first appearance in the file)
+    """
+    if not os.path.exists(input_filename):
+        print("File", input_filename, "not found.")
+        return [], {}, {}
+
+    ranges = chunk_ranges(input_filename, workers * CHUNKS_PER_WORKER)
+
+    str_to_int_dict = {}
+    int_to_str_dict = {}
+    dataset = CompactDataset()
+    with ProcessPoolExecutor(workers) as executor:
+        for chunk, vocabulary in executor.map(parse_chunk, [input_filename] * len(ranges),
+                                              [start for start, _ in ranges], [end for _, end in ranges]):
+            """Events of each chunk are numbered from 0, in order of first
+            appearance in the chunk
+            """
+            event_map = []
+            for string in vocabulary:
+                if string not in str_to_int_dict:
+                    str_to_int_dict[string] = len(str_to_int_dict) + 1
+                    int_to_str_dict[len(str_to_int_dict)] = string
+                event_map.append(str_to_int_dict[string])
+            dataset.extend(chunk, event_map)
+
+    if not compact:
+        dataset = dataset.to_sequences()
+    return dataset, int_to_str_dict, str_to_int_dict
+
+
+def load_cached_ds(input_filename, cache_filename=None, workers=1):
+    """Return the sequence dataset contained in input_filename like load_ds,
+    as a memory-mapped CompactDataset; the dataset is read from binary file
+    cache_filename (input_filename + ".gspds" by default) if it was converted
+    from the current version of input_filename, otherwise input_filename is
+    parsed (by workers processes) and the binary file is (re)written
+    """
+    if cache_filename is None:
+        cache_filename = input_filename + CACHE_SUFFIX
+
+    if not is_binary_ds_fresh(cache_filename, input_filename):
+        dataset, int_to_str_dict, _ = load_ds(input_filename, compact=True, workers=workers)
+        if not dataset:
+            return dataset, {}, {}
+        write_binary_ds(cache_filename, dataset, int_to_str_dict, input_filename)
+
+    return read_binary_ds(cache_filename)
+
+
+def format_sequence(elements, support_count, int_to_str_dict=None):
+    """Return the output file line for a frequent sequence; events are
+    converted to strings with int_to_str_dict, if given
+    """
+    line = []
+    for element in elements:
+        sorted_element = []
+        for event in element:
+            sorted_element.append(int_to_str_dict[event] if int_to_str_dict is not None else event)
+        sorted_element.sort()
+
+        for event in sorted_element:
+            line.append(f"{event} ")
+
+        line.append("-1 ")
+    line.append(f"#SUP: {support_count}\n")
+    return "".join(line)
+
+
+def parse_sequence(line):
+    """Return the elements (as tuples of event strings) and the support count
+    of a sequence from an output file line
+    """
+    pattern, _, support_count = line.partition("#SUP:")
+    elements = []
+    element = []
+    for string in pattern.split():
+        if string == "-1":
+            elements.append(tuple(element))
+            element = []
+        else:
+            element.append(string)
+    return tuple(elements), int(support_count)
+
+
 class Sequence:
     """A class that models a sequence.
+
+    Elements are stored as an immutable tuple of tuples of events, so that
+    sequences can share elements and be hashed; the number of events, the
+    hash and the subsequences obtained by dropping the first/last event are
+    computed once.
     """
 
+    __slots__ = ("elements", "set_of_indexes", "length", "_hash", "_drop_first", "_drop_last")
+
     def __init__(self, elements, set_of_indexes):
         """Initialize an instance of the class with a reference to the elements
-        of the sequence and the set of dataset indexes corresponding to the
-        dataset sequences the sequence could appear in
+        of the sequence and the set of dataset indexes (as a Bitmap)
+        corresponding to the dataset sequences the sequence could appear in
         """
+        if type(elements) is not tuple:
+            elements = freeze(elements)
         self.elements = elements
         self.set_of_indexes = set_of_indexes
+        self.length = sum(len(element) for element in elements)
+        self._hash = hash(elements)
+        self._drop_first = None
+        self._drop_last = None
+
+    def drop_first(self):
+        """Return the elements of the subsequence obtained by removing the
+        first event
+        """
+        if self._drop_first is None:
+            if len(self.elements[0]) == 1:
+                self._drop_first = self.elements[1:]
+            else:
+                self._drop_first = (self.elements[0][1:],) + self.elements[1:]
+        return self._drop_first
+
+    def drop_last(self):
+        """Return the elements of the subsequence obtained by removing the
+        last event
+        """
+        if self._drop_last is None:
+            if len(self.elements[-1]) == 1:
+                self._drop_last = self.elements[:-1]
+            else:
+                self._drop_last = self.elements[:-1] + (self.elements[-1][:-1],)
+        return self._drop_last
+
+    def __len__(self):
+        return self.length
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence):
+            return self.elements == other.elements
+        return NotImplemented
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"Sequence({self.elements})"
@@ -0,0 +1,90 @@
+"""Max number of candidates stored in a leaf before it gets split"""
+LEAF_SIZE = 16
+
+
+class HashTree:
+    """A class that implements the GSP candidate hash-tree.
+
+    Candidate k-sequences are stored in the leaves of the tree; an interior
+    node at depth d hashes candidates on their d-th event (elements are
+    flattened, events within an element are sorted). Given a data-sequence,
+    the tree returns all the leaves holding candidates it could contain, so
+    that each data-sequence is visited only once per level.
+    """
+
+    def __init__(self, leaf_size=LEAF_SIZE):
+        """Initialize an empty tree whose leaves hold at most leaf_size
+        candidates (unless they can't be split any further)
+        """
+        self.leaf_size = leaf_size
+        self.root = _Node()
+
+    def insert(self, candidate):
+        """Insert a candidate sequence in the tree"""
+        events = flatten(candidate.elements)
+        node = self.root
+        depth = 0
+        while node.children is not None:
+            node = node.children.setdefault(events[depth], _Node())
+            depth += 1
+
+        node.candidates.append((candidate, events))
+        if len(node.candidates) > self.leaf_size and depth < len(events):
+            self._split(node, depth)
+
+    def _split(self, node, depth):
+        """Turn a leaf at the given depth into an interior node"""
+        candidates = node.candidates
+        node.candidates = None
+        node.children = {}
+        for candidate, events in candidates:
+            child = node.children.setdefault(events[depth], _Node())
+            child.candidates.append((candidate, events))
+
+        for child in node.children.values():
+            if len(child.candidates) > self.leaf_size and depth + 1 < len(child.candidates[0][1]):
+                self._split(child, depth + 1)
+
+    def leaves(self, sequence):
+        """Return the leaves holding candidates possibly contained in the
+        given data-sequence
+        """
+        flat = [event for element in sequence for event in sorted(element)]
+        found = {}
+        self._visit(self.root, flat, 0, {}, found)
+        return found.values()
+
+    def _visit(self, node, flat, start, visited, found):
+        """Descend the tree hashing all events from position start onwards"""
+        if node.children is None:
+            found[id(node)] = node
+            return
+
+        """A node already reached from an earlier position needs no other
+        visit, as its descendants were already reachable from there
+        """
+        if visited.get(id(node), len(flat)) <= start:
+            return
+        visited[id(node)] = start
+
+        for i in range(start, len(flat)):
+            child = node.children.get(flat[i])
+            if child is not None:
+                self._visit(child, flat, i + 1, visited, found)
+
+
+class _Node:
+    """A node of the hash-tree, either a leaf (holding candidates) or an
+    interior node (holding children keyed by event)
+    """
+
+    __slots__ = ("children", "candidates")
+
+    def __init__(self):
+        self.children = None
+        self.candidates = []
+
+
+def flatten(elements):
+    """Return the events of a sequence as a tuple, in order"""
+    return tuple(event for element in elements for event in element)
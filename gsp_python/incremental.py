@@ -0,0 +1,164 @@
+import math
+import pickle
+from .bitmap import Bitmap
+from .dataset import CompactDataset
+from .gsp import GSP, Sequence
+
+
+class IncrementalGSP(GSP):
+    """A class that implements incremental mining with the GSP algorithm.
+
+    Besides the frequent sequences, an instance keeps the support of all the
+    candidates counted during the last run, including the negative border
+    (the candidates found to be infrequent). When new data-sequences are
+    appended, the support of known candidates is updated by scanning only the
+    new data-sequences; old ones are re-scanned only for candidates that may
+    have crossed the threshold and for candidates never counted before.
+    """
+
+    """Supports of 2-sequences must be tracked like the ones of the other
+    levels
+    """
+    cooccurrence_level2 = False
+
+    def __init__(self, ds, minsup, max_k=math.inf, maxgap=math.inf, mingap=0, maxspan=math.inf, verbose=False,
+                 callback=None):
+        """Initialize an instance of the class like GSP; the dataset must be
+        a list or a CompactDataset not mapped from a file, so that new
+        data-sequences can be appended to it
+        """
+        if isinstance(ds, CompactDataset) and ds.filename is not None:
+            raise ValueError("datasets mapped from a file can't be extended, load them with load_ds instead")
+        super().__init__(ds, minsup, max_k, maxgap, mingap, maxspan, verbose, callback=callback)
+
+        """Set of containing data-sequences of each event"""
+        self.event_sets = {event: sequence_list[0].set_of_indexes
+                           for event, sequence_list in self.frequent_sequences.items()}
+
+        """Support of each candidate counted during the last run: either the
+        Bitmap of the data-sequences containing it or, if it was discarded
+        before all of them were checked, an upper bound on its support count
+        """
+        self.supports = {}
+        self.new_supports = {}
+
+        """Index of the first data-sequence not mined yet"""
+        self.delta_start = 0
+
+    def __getstate__(self):
+        """The callback isn't saved, as it may not be picklable"""
+        state = self.__dict__.copy()
+        state["callback"] = None
+        return state
+
+    def _iter_gsp(self, executor=None):
+        self.new_supports = {}
+        yield from super()._iter_gsp(executor)
+
+        """Supports of candidates not generated in this run are discarded"""
+        self.supports = self.new_supports
+        self.new_supports = {}
+        self.delta_start = len(self.ds)
+
+    def append(self, new_sequences):
+        """Append new data-sequences to the dataset and mine the updated
+        dataset, returning all its frequent sequences like run_gsp
+        """
+        start = len(self.ds)
+        for sequence in new_sequences:
+            self.ds.append(sequence)
+
+        """Update the set of containing data-sequences of each event"""
+        new_event_indexes = {}
+        for index in range(start, len(self.ds)):
+            for element in self.ds[index]:
+                for event in element:
+                    event_indexes = new_event_indexes.setdefault(event, [])
+                    if not event_indexes or event_indexes[-1] != index:
+                        event_indexes.append(index)
+        for event, event_indexes in new_event_indexes.items():
+            self.event_sets[event] = self.event_sets.get(event, Bitmap()) | Bitmap.from_indexes(event_indexes)
+
+        self.frequent_sequences = {event: [Sequence(((event,),), indexes)]
+                                   for event, indexes in self.event_sets.items()}
+        return self.run_gsp()
+
+    def support_count(self, executor=None):
+        """Calculate support count for all k-candidates, reusing the supports
+        found during the last run, add all frequent ones to
+        frequent_sequences
+        """
+        is_contained = self.select_is_contained()
+
+        n = len(self.ds)
+        threshold = self.minsup * n
+        old_indexes = Bitmap.from_range(0, self.delta_start)
+        new_indexes = Bitmap.from_range(self.delta_start, n)
+
+        self.containment_checks = 0
+        self.early_aborts = 0
+
+        contained = [None] * len(self.candidate_sequences)
+        unknown = []
+        for position, candidate in enumerate(self.candidate_sequences):
+            support = self.supports.get(candidate.elements)
+            if support is None:
+                """Candidate never counted before, all data-sequences must be
+                checked
+                """
+                unknown.append(position)
+                continue
+
+            new_contained = self.scan(candidate, candidate.set_of_indexes & new_indexes, is_contained)
+            if isinstance(support, Bitmap):
+                contained[position] = support | new_contained
+            elif support + len(new_contained) < threshold:
+                """Still infrequent, whatever its exact support count is"""
+                self.new_supports[candidate.elements] = support + len(new_contained)
+                continue
+            else:
+                """Candidate may have crossed the threshold, old data-sequences
+                must be re-scanned
+                """
+                old_contained = self.scan(candidate, candidate.set_of_indexes & old_indexes, is_contained)
+                contained[position] = old_contained | new_contained
+            self.new_supports[candidate.elements] = contained[position]
+
+        if unknown:
+            unknown_contained, checks = \
+                self.find_containing_sequences([self.candidate_sequences[position] for position in unknown])
+            self.containment_checks += checks
+            for position, indexes in zip(unknown, unknown_contained):
+                elements = self.candidate_sequences[position].elements
+                if indexes is None:
+                    """Candidate was found to be infrequent early, its support
+                    count is lower than the threshold
+                    """
+                    self.early_aborts += 1
+                    self.new_supports[elements] = math.ceil(threshold) - 1
+                else:
+                    contained[position] = Bitmap.from_indexes(indexes)
+                    self.new_supports[elements] = contained[position]
+
+        self.add_frequent_candidates(contained)
+
+    def scan(self, candidate, indexes, is_contained):
+        """Return the Bitmap of the data-sequences among indexes that contain
+        candidate
+        """
+        self.containment_checks += len(indexes)
+        targets = self.containment_targets()
+        return Bitmap.from_indexes(index for index in indexes if is_contained(candidate.elements, targets[index]))
+
+    def save(self, output_filename):
+        """Save the state of the instance (dataset included) to
+        output_filename
+        """
+        with open(output_filename, 'wb') as output:
+            pickle.dump(self, output)
+
+    @staticmethod
+    def load(input_filename):
+        """Return the instance saved to input_filename"""
+        with open(input_filename, 'rb') as input_file:
+            return pickle.load(input_file)
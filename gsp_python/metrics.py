@@ -0,0 +1,82 @@
+import json
+import sys
+
+try:
+    import resource
+except ImportError:
+    """resource is only available on Unix"""
+    resource = None
+
+"""Available formats for exporting metrics"""
+METRICS_FORMATS = ("json", "prometheus")
+
+"""Description of each per-level metric, used for Prometheus exports"""
+DESCRIPTIONS = {
+    "generated": "Candidate sequences generated",
+    "pruned": "Candidate sequences pruned",
+    "candidates": "Candidate sequences left after pruning",
+    "frequent": "Frequent sequences found",
+    "containment_checks": "Containment checks performed during support counting",
+    "early_aborts": "Candidates discarded before all their containment checks were performed",
+    "generate_time": "Time spent generating candidates in seconds",
+    "prune_time": "Time spent pruning candidates in seconds",
+    "support_count_time": "Time spent counting support in seconds",
+    "peak_memory": "Peak resident set size of the process in bytes at the end of the level",
+}
+
+
+def level_metrics(k, generated, pruned, frequent, containment_checks=0, early_aborts=0,
+                  generate_time=0.0, prune_time=0.0, support_count_time=0.0):
+    """Return the dictionary of metrics for level k (the level where
+    k-sequences are found)
+    """
+    return {
+        "k": k,
+        "generated": generated,
+        "pruned": pruned,
+        "candidates": generated - pruned,
+        "frequent": frequent,
+        "containment_checks": containment_checks,
+        "early_aborts": early_aborts,
+        "generate_time": generate_time,
+        "prune_time": prune_time,
+        "support_count_time": support_count_time,
+        "peak_memory": peak_memory(),
+    }
+
+
+def peak_memory():
+    """Return the peak resident set size of the current process in bytes, or
+    None if it can't be measured on the current platform
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    """ru_maxrss is in bytes on macOS, in kilobytes elsewhere"""
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def to_prometheus(metrics):
+    """Return the metrics of all levels in the Prometheus text format"""
+    lines = []
+    for name, description in DESCRIPTIONS.items():
+        lines.append(f"# HELP gsp_{name} {description}")
+        lines.append(f"# TYPE gsp_{name} gauge")
+        for level in metrics:
+            if level[name] is not None:
+                lines.append(f'gsp_{name}{{k="{level["k"]}"}} {level[name]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(metrics, output_filename, metrics_format="json"):
+    """Write the metrics of all levels to output_filename, either as JSON or
+    in the Prometheus text format
+    """
+    if metrics_format not in METRICS_FORMATS:
+        raise ValueError(f"metrics_format must be one of {METRICS_FORMATS}")
+
+    with open(output_filename, 'w') as output:
+        if metrics_format == "json":
+            json.dump(metrics, output, indent=2)
+        else:
+            output.write(to_prometheus(metrics))
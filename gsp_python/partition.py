@@ -0,0 +1,177 @@
+import contextlib
+import logging
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from .dataset import BLOCK_SIZE, chunk_ranges
+from .gsp import GSP, Sequence, format_sequence, load_ds, parse_sequence
+
+"""Logger for tracking execution on stdout"""
+logger = logging.getLogger(__name__)
+
+"""Header of count files, followed by the number of data-sequences in the
+chunk
+"""
+SEQUENCES_HEADER = "#SEQUENCES:"
+
+
+def split_dataset(input_filename, nchunks, output_prefix):
+    """Split the dataset in input_filename in (at most) nchunks chunks, written
+    to files output_prefix.0, output_prefix.1, ...; return their names
+    """
+    output_filenames = []
+    with open(input_filename, 'rb') as input_file:
+        for i, (start, end) in enumerate(chunk_ranges(input_filename, nchunks)):
+            output_filename = f"{output_prefix}.{i}"
+            input_file.seek(start)
+            with open(output_filename, 'wb') as output:
+                remaining = end - start
+                while remaining > 0:
+                    block = input_file.read(min(BLOCK_SIZE, remaining))
+                    output.write(block)
+                    remaining -= len(block)
+            output_filenames.append(output_filename)
+    return output_filenames
+
+
+def mine_chunk(chunk_filename, output_filename, minsup, max_k=math.inf, maxgap=math.inf, mingap=0,
+               maxspan=math.inf, engine="horizontal"):
+    """Local phase: write the frequent sequences of the chunk in
+    chunk_filename (with the same relative minsup) to output_filename, in the
+    format of the output of GSP
+    """
+    dataset, int_to_str_dict, _ = load_ds(chunk_filename)
+    with open(output_filename, 'w') as output:
+        if not dataset:
+            return
+        algo_gsp = GSP(dataset, minsup, max_k, maxgap, mingap, maxspan, engine=engine)
+        for elements, support_count in algo_gsp.iter_gsp():
+            output.write(format_sequence(elements, support_count, int_to_str_dict))
+
+
+def read_candidates(candidate_filenames):
+    """Return the union of the sequences in the given GSP output files (as
+    tuples of elements, each a tuple of event strings), sorted by size
+    """
+    candidates = {}
+    for candidate_filename in candidate_filenames:
+        with open(candidate_filename) as input_file:
+            for line in input_file:
+                if line.strip():
+                    elements, _ = parse_sequence(line)
+                    candidates[elements] = None
+    return sorted(candidates, key=lambda elements: sum(len(element) for element in elements))
+
+
+def count_chunk(chunk_filename, output_filename, candidate_filenames, maxgap=math.inf, mingap=0,
+                maxspan=math.inf, engine="horizontal"):
+    """Global phase: write the support count in the chunk in chunk_filename of
+    every sequence in the given GSP output files (the locally frequent
+    sequences of all chunks) to output_filename
+    """
+    dataset, _, str_to_int_dict = load_ds(chunk_filename)
+    candidates = read_candidates(candidate_filenames)
+
+    """minsup is 0, so that no candidate is discarded before all its
+    containing data-sequences are checked; the vertical engine only counts
+    candidates generated from their parents, the horizontal one is used instead
+    """
+    algo_gsp = GSP(dataset, 0, maxgap=maxgap, mingap=mingap, maxspan=maxspan,
+                   engine="horizontal" if engine == "vertical" else engine)
+
+    """Candidates are counted in groups of the same size, as the hash-tree
+    requires; candidates containing events that never occur in the chunk
+    aren't counted at all
+    """
+    counts = [0] * len(candidates)
+    groups = {}
+    for position, elements in enumerate(candidates):
+        if any(event not in str_to_int_dict for element in elements for event in element):
+            continue
+        int_elements = tuple(tuple(sorted(str_to_int_dict[event] for event in element)) for element in elements)
+        set_of_indexes = None
+        for element in int_elements:
+            for event in element:
+                event_indexes = algo_gsp.frequent_sequences[event][0].set_of_indexes
+                set_of_indexes = event_indexes if set_of_indexes is None else set_of_indexes & event_indexes
+        groups.setdefault(sum(len(element) for element in elements), []).append(
+            (position, Sequence(int_elements, set_of_indexes)))
+
+    for group in groups.values():
+        contained, _ = algo_gsp.count_candidates([candidate for _, candidate in group])
+        for (position, _), indexes in zip(group, contained):
+            counts[position] = len(indexes)
+
+    with open(output_filename, 'w') as output:
+        output.write(f"{SEQUENCES_HEADER} {len(dataset)}\n")
+        for elements, support_count in zip(candidates, counts):
+            output.write(format_sequence(elements, support_count))
+
+
+def merge_counts(count_filenames, output_filename, minsup):
+    """Sum the support counts in the given count files (one for each chunk)
+    and write the globally frequent sequences to output_filename, in the
+    format of the output of GSP; return the number of sequences written
+    """
+    n = 0
+    totals = {}
+    for count_filename in count_filenames:
+        with open(count_filename) as input_file:
+            for line in input_file:
+                if line.startswith(SEQUENCES_HEADER):
+                    n += int(line[len(SEQUENCES_HEADER):])
+                elif line.strip():
+                    pattern, _, support_count = line.partition("#SUP:")
+                    totals[pattern] = totals.get(pattern, 0) + int(support_count)
+
+    found = 0
+    with open(output_filename, 'w') as output:
+        for pattern, support_count in totals.items():
+            if n and support_count / n >= minsup:
+                output.write(f"{pattern}#SUP: {support_count}\n")
+                found += 1
+    return found
+
+
+def mine_partitioned(input_filename, output_filename, minsup, nchunks, max_k=math.inf, maxgap=math.inf, mingap=0,
+                     maxspan=math.inf, engine="horizontal", workers=1, work_dir=None, verbose=False):
+    """Mine the dataset in input_filename in two phases (as in the SON
+    algorithm): split it in nchunks chunks, find the frequent sequences of
+    each chunk, and count all of them on every chunk to find the globally
+    frequent ones, written to output_filename; chunks are processed by
+    workers processes, and intermediate files are kept in work_dir if given
+    (otherwise a temporary directory is used)
+    """
+    if not verbose:
+        logger.disabled = True
+
+    temp_dir = None
+    if work_dir is None:
+        temp_dir = work_dir = tempfile.mkdtemp(prefix="gsp-partition-")
+    try:
+        chunk_filenames = split_dataset(input_filename, nchunks, os.path.join(work_dir, "chunk"))
+        local_filenames = [f"{chunk_filename}.local" for chunk_filename in chunk_filenames]
+        count_filenames = [f"{chunk_filename}.count" for chunk_filename in chunk_filenames]
+        logger.info(f"Dataset split in {len(chunk_filenames)} chunks")
+
+        with ProcessPoolExecutor(workers) if workers > 1 else contextlib.nullcontext() as executor:
+            map_chunks = map if executor is None else executor.map
+            list(map_chunks(partial(mine_chunk, minsup=minsup, max_k=max_k, maxgap=maxgap, mingap=mingap,
+                                    maxspan=maxspan, engine=engine),
+                            chunk_filenames, local_filenames))
+            logger.info("Local phase completed")
+
+            list(map_chunks(partial(count_chunk, candidate_filenames=local_filenames, maxgap=maxgap,
+                                    mingap=mingap, maxspan=maxspan, engine=engine),
+                            chunk_filenames, count_filenames))
+            logger.info("Global counting phase completed")
+
+        found = merge_counts(count_filenames, output_filename, minsup)
+        logger.info(f"Frequent sequences found: {found}")
+        return found
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,80 @@
+from bisect import bisect_left
+import math
+
+
+def build_position_index(sequence):
+    """Return the position index of a data-sequence: a dictionary mapping
+    each event to the sorted list of positions of the elements containing it
+    """
+    index = {}
+    for position, element in enumerate(sequence):
+        for event in element:
+            event_positions = index.setdefault(event, [])
+            if not event_positions or event_positions[-1] != position:
+                event_positions.append(position)
+    return index
+
+
+def next_position(lists, start):
+    """Return the first position from start onwards contained in all the
+    given sorted lists of positions (one for each event of an element), or
+    None if there's none
+    """
+    position = start
+    found = False
+    while not found:
+        found = True
+        for event_positions in lists:
+            i = bisect_left(event_positions, position)
+            if i == len(event_positions):
+                return None
+            if event_positions[i] != position:
+                """Jump to the next position where this event occurs"""
+                position = event_positions[i]
+                found = False
+    return position
+
+
+def is_contained(c, index, maxgap, mingap, maxspan):
+    """Check if candidate c is contained in the data-sequence whose position
+    index is given, with the maxgap/mingap/maxspan time constraints
+    """
+    lists = []
+    for element in c:
+        element_lists = []
+        for event in element:
+            event_positions = index.get(event)
+            if event_positions is None:
+                return False
+            element_lists.append(event_positions)
+        lists.append(element_lists)
+
+    last = len(lists) - 1
+    """failed[(j, position)] is the greatest start position with which
+    matching element j at position (and the following ones after it) failed;
+    without maxspan, failures don't depend on the start position
+    """
+    failed = {}
+
+    def match(j, previous, first):
+        """Check if elements from j onwards can be matched after element j-1
+        was matched at position previous
+        """
+        limit = min(previous + maxgap, first + maxspan)
+        position = next_position(lists[j], previous + mingap + 1)
+        while position is not None and position <= limit:
+            if j == last:
+                return True
+            if failed.get((j, position), -1) < first:
+                if match(j + 1, position, first):
+                    return True
+                failed[(j, position)] = first if maxspan != math.inf else math.inf
+            position = next_position(lists[j], position + 1)
+        return False
+
+    first = next_position(lists[0], 0)
+    while first is not None:
+        if last == 0 or match(1, first, first):
+            return True
+        first = next_position(lists[0], first + 1)
+    return False
@@ -0,0 +1,185 @@
+import asyncio
+from functools import lru_cache, partial
+import logging
+import math
+from . import positions
+from .bitmap import Bitmap
+from .gsp import GSP
+
+"""Logger for tracking execution on stdout"""
+logger = logging.getLogger(__name__)
+
+"""Default number of query results kept in the LRU cache"""
+CACHE_SIZE = 4096
+
+"""Default address the query server listens on"""
+HOST = "127.0.0.1"
+PORT = 7878
+
+
+class QueryEngine:
+    """A class that answers support queries about single sequences on a
+    dataset loaded once.
+
+    An inverted index (event -> set of the data-sequences containing it) is
+    used to find the data-sequences that contain all the events of the
+    queried sequence, which are then checked with the containment checks of
+    GSP (on the position index of each data-sequence, built once, when time
+    constraints are given). The results of the last queries are kept in an
+    LRU cache.
+    """
+
+    def __init__(self, ds, str_to_int_dict=None, cache_size=CACHE_SIZE, verbose=False):
+        """Initialize an instance of the class with the dataset to query (a
+        list of lists of lists of events or a CompactDataset) and, if events
+        are given as strings in queries, the dictionary converting them to
+        the integers used in the dataset
+        """
+        self.verbose = verbose
+        if not verbose:
+            logger.disabled = True
+
+        """A GSP instance finds the data-sequences containing each event"""
+        self.gsp = GSP(ds, 0)
+        self.ds = ds
+        self.event_sets = {event: sequence_list[0].set_of_indexes
+                           for event, sequence_list in self.gsp.frequent_sequences.items()}
+        self.position_indexes = [positions.build_position_index(sequence) for sequence in ds]
+        self.str_to_int_dict = str_to_int_dict
+
+        self.cached_containing = lru_cache(maxsize=cache_size)(self.find_containing)
+        logger.info(f"Index built: {len(ds)} data-sequences, {len(self.event_sets)} events")
+
+    def parse_pattern(self, pattern):
+        """Return the elements of a sequence given as a string in the format
+        of the dataset files (events separated by spaces, each element
+        terminated by -1; the last -1 can be omitted); events are converted
+        with str_to_int_dict if given, or to integers otherwise
+        """
+        elements = []
+        element = []
+        for string in pattern.split():
+            if string == "-1":
+                elements.append(element)
+                element = []
+            elif self.str_to_int_dict is not None:
+                """Events missing from the dataset are kept as strings, so
+                that the sequence is found in no data-sequence
+                """
+                element.append(self.str_to_int_dict.get(string, string))
+            else:
+                element.append(int(string))
+        if element:
+            elements.append(element)
+        return elements
+
+    def containing(self, elements, maxgap=math.inf, mingap=0, maxspan=math.inf):
+        """Return the Bitmap of the data-sequences containing the sequence
+        with the given elements (each an iterable of events), with the
+        maxgap/mingap/maxspan time constraints
+        """
+        if not elements or not all(elements):
+            raise ValueError("sequences must have at least one element, and elements at least one event")
+        key = tuple(tuple(sorted(set(element), key=str)) for element in elements)
+        return self.cached_containing(key, maxgap, mingap, maxspan)
+
+    def support(self, elements, maxgap=math.inf, mingap=0, maxspan=math.inf):
+        """Return the support count of the sequence with the given elements,
+        with the maxgap/mingap/maxspan time constraints
+        """
+        return len(self.containing(elements, maxgap, mingap, maxspan))
+
+    def find_containing(self, elements, maxgap, mingap, maxspan):
+        """Return the Bitmap of the data-sequences containing the sequence
+        with the given elements (tuples of distinct events), checking only
+        the ones containing all its events
+        """
+        indexes = None
+        for element in elements:
+            for event in element:
+                event_set = self.event_sets.get(event, Bitmap())
+                indexes = event_set if indexes is None else indexes & event_set
+
+        if maxgap == math.inf and mingap == 0 and maxspan == math.inf:
+            is_contained = self.gsp.is_contained_without_time_constraints
+            targets = self.ds
+        else:
+            is_contained = partial(positions.is_contained, maxgap=maxgap, mingap=mingap, maxspan=maxspan)
+            targets = self.position_indexes
+        return Bitmap.from_indexes(index for index in indexes if is_contained(elements, targets[index]))
+
+    def execute(self, line):
+        """Execute a query of the line protocol and return the response line:
+        "SUPPORT [-t maxgap mingap maxspan] pattern" is answered with
+        "OK <support count>", "SEQUENCES [-t maxgap mingap maxspan] pattern"
+        with "OK <index> <index> ..." (the indexes of the data-sequences
+        containing the pattern) and "STATS" with the number of data-sequences
+        and cache statistics; errors are answered with "ERR <message>"
+        """
+        command, _, arguments = line.strip().partition(" ")
+        command = command.upper()
+        try:
+            if command == "STATS":
+                info = self.cached_containing.cache_info()
+                return (f"OK sequences={len(self.ds)} events={len(self.event_sets)} hits={info.hits} "
+                        f"misses={info.misses} cached={info.currsize}")
+            if command not in ["SUPPORT", "SEQUENCES"]:
+                return f"ERR unknown command {command!r}"
+
+            constraints = (math.inf, 0, math.inf)
+            strings = arguments.split()
+            if strings[:1] == ["-t"]:
+                constraints = tuple(float(string) for string in strings[1:4])
+                if len(constraints) < 3:
+                    return "ERR -t requires maxgap, mingap and maxspan"
+                arguments = " ".join(strings[4:])
+
+            indexes = self.containing(self.parse_pattern(arguments), *constraints)
+        except ValueError as error:
+            return f"ERR {error}"
+
+        if command == "SUPPORT":
+            return f"OK {len(indexes)}"
+        return " ".join(["OK"] + [str(index) for index in indexes])
+
+
+async def handle_client(engine, reader, writer):
+    """Answer the queries sent by a client, one per line, until it sends QUIT
+    or closes the connection; queries are executed in a separate thread, so
+    that other clients are served in the meantime
+    """
+    peer = writer.get_extra_info("peername")
+    logger.info(f"Client connected: {peer}")
+    try:
+        while line := await reader.readline():
+            line = line.decode(errors="replace")
+            if line.strip().upper() == "QUIT":
+                break
+            if not line.strip():
+                continue
+            response = await asyncio.to_thread(engine.execute, line)
+            writer.write(f"{response}\n".encode())
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        logger.info(f"Client disconnected: {peer}")
+
+
+async def serve(engine, host=HOST, port=PORT):
+    """Serve the queries of the line protocol (see QueryEngine.execute) to
+    any number of concurrent clients, until cancelled
+    """
+    server = await asyncio.start_server(partial(handle_client, engine), host, port)
+    logger.info(f"Listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def run_server(engine, host=HOST, port=PORT):
+    """Run the query server until interrupted"""
+    try:
+        asyncio.run(serve(engine, host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,92 @@
+from bisect import bisect_left, bisect_right
+import math
+
+"""Id-lists pair each sequence id with the occurrences of a sequence in the
+corresponding data-sequence. An occurrence is a (first, last) tuple holding the
+positions of the elements where the first and the last element of the sequence
+were matched; occurrences are kept sorted by last position. When no maxspan is
+given the first position is irrelevant and is always stored as 0, so that
+equivalent occurrences collapse into a single one.
+"""
+
+
+def build_event_positions(ds):
+    """Return the vertical representation of dataset ds, pairing each event
+    with a dictionary that maps the id of every sequence the event appears in
+    to the sorted list of positions of the elements containing it
+    """
+    event_positions = {}
+    for index, sequence in enumerate(ds):
+        for position, element in enumerate(sequence):
+            for event in element:
+                positions = event_positions.setdefault(event, {}).setdefault(index, [])
+                """Events can appear more than once in the same element"""
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+    return event_positions
+
+
+def event_idlist(positions, maxspan=math.inf):
+    """Return the id-list of the 1-sequence whose occurrences are given by
+    positions
+    """
+    idlist = {}
+    for index, event_positions in positions.items():
+        if maxspan == math.inf:
+            idlist[index] = [(0, position) for position in event_positions]
+        else:
+            idlist[index] = [(position, position) for position in event_positions]
+    return idlist
+
+
+def join_same_element(prefix_idlist, positions):
+    """Return the id-list of the sequence obtained by adding an event to the
+    last element of the prefix, given the id-list of the prefix and the
+    positions of the event
+    """
+    idlist = {}
+    for index, occurrences in prefix_idlist.items():
+        event_positions = positions.get(index)
+        if event_positions is None:
+            continue
+
+        new_occurrences = []
+        for first, last in occurrences:
+            i = bisect_left(event_positions, last)
+            if i < len(event_positions) and event_positions[i] == last:
+                new_occurrences.append((first, last))
+
+        if new_occurrences:
+            idlist[index] = new_occurrences
+    return idlist
+
+
+def join_new_element(prefix_idlist, positions, maxgap=math.inf, mingap=0, maxspan=math.inf):
+    """Return the id-list of the sequence obtained by appending an event as a
+    new element after the prefix, given the id-list of the prefix and the
+    positions of the event, honoring the maxgap/mingap/maxspan constraints
+    """
+    idlist = {}
+    for index, occurrences in prefix_idlist.items():
+        event_positions = positions.get(index)
+        if event_positions is None:
+            continue
+
+        if maxgap == math.inf and maxspan == math.inf:
+            """Without an upper bound, the earliest occurrence of the prefix
+            allows all the others
+            """
+            start = bisect_right(event_positions, occurrences[0][1] + mingap)
+            new_occurrences = [(0, position) for position in event_positions[start:]]
+        else:
+            found = set()
+            for first, last in occurrences:
+                start = bisect_right(event_positions, last + mingap)
+                end = bisect_right(event_positions, min(last + maxgap, first + maxspan))
+                for position in event_positions[start:end]:
+                    found.add((first, position))
+            new_occurrences = sorted(found, key=lambda occurrence: occurrence[1])
+
+        if new_occurrences:
+            idlist[index] = new_occurrences
+    return idlist
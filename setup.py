@@ -21,6 +21,7 @@ setup(
     long_description=long_description,
     packages=find_packages(),
     install_requires=[],
+    extras_require={'vectorized': ['numpy']},
     keywords=['python', 'gsp', 'data mining', 'sequential pattern mining', 'seuence mining'],
     classifiers=[
         "Programming Language :: Python :: 3",